@@ -1,33 +1,66 @@
 # app.py
 
-import os
+from config.settings import DATABASE_URL, SOCKETIO_ASYNC_MODE
+if SOCKETIO_ASYNC_MODE == 'eventlet':
+    # Patch blocking stdlib I/O before anything else is imported, so the database
+    # engine, Redis client and OpenAI HTTP sockets are all created green. Under the
+    # gunicorn eventlet worker this is already done and the call is a no-op.
+    import eventlet
+    eventlet.monkey_patch()
+
+    if DATABASE_URL.startswith('postgres'):
+        # psycopg2 is a C extension that blocks the hub while it waits on the server
+        from psycogreen.eventlet import patch_psycopg
+        patch_psycopg()
+
 import logging
-from flask import Flask, render_template
+from flask import Flask, Response, render_template, request
 from flask_socketio import SocketIO, emit
 from werkzeug.middleware.proxy_fix import ProxyFix
-from config.settings import SECRET_KEY, CORS_ORIGINS, DEBUG, OPENAI_API_KEY
+from config.settings import (
+    SECRET_KEY, CORS_ORIGINS, DEBUG, OPENAI_API_KEY, REDIS_URL, SOCKETIO_SERIALIZER,
+    LOG_LEVEL, SOCKETIO_LOGGING, DEPLOY_ID
+)
 from game.logic import GameManager
-from socket_handlers.handlers import register_handlers
-from models.database import Base, engine, SessionLocal, get_win_counter, WinCounter, get_player_by_sid, remove_player, get_players, get_lobby
+from socket_handlers.handlers import register_handlers, log_connection_event
+from utils.serialization import OrjsonSerializer, OrjsonProvider
+from cache.client import redis_client
+from models.database import engine, clear_game_tables
+
+# How long a deployment's startup reset claim is kept (outlives any single release)
+STARTUP_RESET_CLAIM_TTL = 30 * 24 * 3600
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger(__name__)
+if not SOCKETIO_LOGGING:
+    # Keep per-packet protocol chatter out of the logs
+    logging.getLogger('socketio').setLevel(logging.WARNING)
+    logging.getLogger('engineio').setLevel(logging.WARNING)
 
 # --- Initialization ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
+app.json = OrjsonProvider(app)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1)
 
-# SocketIO configuration with eventlet for Render compatibility
+# msgpack packs events as binary frames; the page loads the matching client parser
+if SOCKETIO_SERIALIZER == 'msgpack':
+    serializer_options = {'serializer': 'msgpack'}
+else:
+    serializer_options = {'json': OrjsonSerializer}  # C-accelerated encoding for every emit
+
+# SocketIO configuration; eventlet by default for Render compatibility
 socketio = SocketIO(
     app,
     cors_allowed_origins=CORS_ORIGINS,
-    async_mode="eventlet",
+    async_mode=SOCKETIO_ASYNC_MODE,
+    message_queue=REDIS_URL,  # lets several workers share rooms when set
+    **serializer_options,
     ping_timeout=60,
     ping_interval=25,
-    logger=True,
-    engineio_logger=True
+    logger=SOCKETIO_LOGGING,
+    engineio_logger=SOCKETIO_LOGGING
 )
 
 # Reset database on startup
@@ -36,8 +69,16 @@ logger.info("Resetting database on startup...")
 # Create game manager first
 game_manager = GameManager(socketio)
 
-# Perform silent database reset for startup (no clients connected yet)
-game_manager._perform_database_reset("main", preserve_win_counter=True)
+# Perform silent database reset for startup (no clients connected yet): empty the
+# per-game tables in one statement, keeping win counters. With several workers
+# sharing Redis only the first worker of each deployment resets, so a late or
+# restarted worker doesn't wipe a lobby the others are already serving. Without a
+# deployment id every boot resets.
+if not DEPLOY_ID or redis_client.claim(f"startup_reset:{DEPLOY_ID}", ttl=STARTUP_RESET_CLAIM_TTL):
+    clear_game_tables()
+    game_manager.invalidate_lobby_data("main")
+else:
+    logger.info("Database already reset for deployment %s, skipping", DEPLOY_ID)
 
 # Clear reset flag to allow new joins and game starts
 game_manager.clear_reset_flag()
@@ -50,66 +91,25 @@ if not OPENAI_API_KEY:
 else:
     logger.info("OpenAI API key is configured.")
 
-# Test event to verify Socket.IO is working
-@socketio.on('test')
-def test_event(data):
-    logger.info(f"Test event received: {data}")
-    emit('test_response', {'message': 'Test successful!'})
+if DEBUG:
+    # Test event to verify Socket.IO is working
+    @socketio.on('test')
+    def test_event(data):
+        logger.info("Test event received: %s", data)
+        emit('test_response', {'message': 'Test successful!'})
 
 @socketio.on('connect')
-def handle_connect(sid):
-    logger.info(f"Client connected: {sid}")
-    # Send a simple test message to verify connection
-    emit('connection_test', {'message': 'Connection established successfully!'})
-
-@socketio.on('disconnect')
-def handle_disconnect(sid):
-    logger.info(f"Client disconnected: {sid}")
-    
-    # Clean up the player from the game state
-    try:
-        # Find the player with this SID
-        session = SessionLocal()
-        try:
-            lobby = get_lobby(session, "main")
-            player = get_player_by_sid(session, lobby, sid)
-            if player:
-                logger.info(f"Removing player {player.username} (SID: {sid}) from game")
-                
-                # Remove the player from the database
-                remove_player(session, player)
-                
-                # Get updated player list
-                players = get_players(session, lobby)
-                player_names = [p.username for p in players]
-                
-                # Emit game update to remaining players
-                socketio.emit('game_update', {
-                    'players': player_names,
-                    'log': f"{player.username} has left the game."
-                }, room="main")
-                
-                logger.info(f"Player {player.username} removed successfully. Remaining players: {player_names}")
-            else:
-                logger.info(f"No player found for SID: {sid}")
-                
-        except Exception as e:
-            logger.error(f"Error cleaning up disconnected player {sid}: {e}")
-        finally:
-            session.close()
-            
-    except Exception as e:
-        logger.error(f"Error in disconnect handler: {e}")
+def handle_connect(auth=None):
+    log_connection_event("Client connected: %s", request.sid)
+    if DEBUG:
+        # Send a simple test message to verify connection; the client doesn't need it
+        emit('connection_test', {'message': 'Connection established successfully!'})
 
 @socketio.on_error_default
 def default_error_handler(e):
-    logger.error(f"SocketIO default error: {e}")
+    logger.error("SocketIO default error: %s", e)
     emit('error', {'message': 'An error occurred. Please try again.'})
 
-@socketio.on('*')
-def catch_all(event, data):
-    logger.info(f"Unhandled event received: {event} with data: {data}")
-
 # Register the main event handlers
 logger.info("Registering event handlers...")
 register_handlers(socketio, game_manager)
@@ -117,37 +117,43 @@ logger.info("Event handlers registered!")
 
 # Send win counter to all connected players on startup
 def send_win_counter_on_startup():
-    session = SessionLocal()
     try:
-        win_counter = get_win_counter(session, "main")
-        socketio.emit('win_counter_update', {
-            'human_wins': win_counter.human_wins,
-            'ai_wins': win_counter.ai_wins
-        }, room="main")
-        logger.info(f"Sent win counter on startup: {win_counter.human_wins} humans, {win_counter.ai_wins} AI")
+        win_counts = game_manager.get_win_counts("main")
+        socketio.emit('win_counter_update', win_counts, room="main")
+        logger.info("Sent win counter on startup: %s humans, %s AI", win_counts['human_wins'], win_counts['ai_wins'])
     except Exception as e:
-        logger.error(f"Error sending win counter on startup: {e}")
-    finally:
-        session.close()
+        logger.error("Error sending win counter on startup: %s", e)
 
-# Schedule win counter broadcast after a short delay to ensure all clients are connected
-import threading
-import time
+# Schedule win counter broadcast after a short delay to ensure all clients are connected.
+# A background task runs on the server's own green threads and yields while it waits.
 def delayed_win_counter_broadcast():
-    time.sleep(2)  # Wait 2 seconds for clients to connect
+    socketio.sleep(2)  # Wait 2 seconds for clients to connect
     send_win_counter_on_startup()
 
-startup_timer = threading.Timer(2.0, delayed_win_counter_broadcast)
-startup_timer.daemon = True
-startup_timer.start()
+socketio.start_background_task(delayed_win_counter_broadcast)
+
+# The page shell only depends on settings, so it is rendered once per process
+_index_html = None
 
 @app.route('/')
 def index():
-    return render_template('game.html')
+    global _index_html
+    if DEBUG:
+        # Re-render so template edits show up without a restart
+        return render_template('game.html', socketio_serializer=SOCKETIO_SERIALIZER)
+    if _index_html is None:
+        _index_html = render_template('game.html', socketio_serializer=SOCKETIO_SERIALIZER)
+    response = Response(_index_html, mimetype='text/html')
+    response.headers['Cache-Control'] = 'public, max-age=300'  # let proxies serve it for a while
+    return response
 
 @app.route('/health')
 def health_check():
-    return {'status': 'healthy', 'message': 'The Outsider game server is running'}
+    status = {'status': 'healthy', 'message': 'The Outsider game server is running'}
+    if DEBUG:
+        # Checked-out vs idle connections, to size DB_POOL_SIZE/DB_MAX_OVERFLOW
+        status['db_pool'] = engine.pool.status()
+    return status
 
 if __name__ == '__main__':
     logger.info("Starting Flask-SocketIO app...")
@@ -0,0 +1,181 @@
+import time
+import orjson
+import logging
+from contextlib import contextmanager
+from config.settings import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+# Redis is optional: without the package or a REDIS_URL every cache call is a miss
+try:
+    import redis
+    from redis.exceptions import RedisError
+except ImportError:
+    redis = None
+    RedisError = Exception
+
+# Seconds between pings while Redis is unreachable
+RECONNECT_CHECK_INTERVAL = 1.0
+
+class RedisClient:
+    """Small wrapper around redis-py that degrades to a no-op when Redis is unavailable."""
+
+    def __init__(self, url=None):
+        self.client = None
+        self.connected = False
+        self._last_ping = 0.0
+        if not url:
+            return
+        if redis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed. Caching is disabled.")
+            return
+        try:
+            self.client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=2)
+        except Exception as e:
+            logger.error("Error creating Redis client: %s", e)
+
+    def is_connected(self):
+        """Check that Redis is configured and reachable.
+
+        A successful ping is trusted until a command fails, so a cache call costs
+        one round trip; while Redis is down it is pinged at most once a second.
+        """
+        if self.client is None:
+            return False
+        if self.connected:
+            return True
+        now = time.monotonic()
+        if now - self._last_ping < RECONNECT_CHECK_INTERVAL:
+            return False
+        self._last_ping = now
+        try:
+            self.connected = bool(self.client.ping())
+        except RedisError as e:
+            logger.error("Redis connection error: %s", e)
+            self.connected = False
+        return self.connected
+
+    def _failed(self, error):
+        """Ping again before the next command if this one failed talking to Redis."""
+        if isinstance(error, RedisError):
+            self.connected = False
+
+    def get(self, key):
+        """Get a value, decoding JSON objects and arrays. Returns None on a miss or error."""
+        if not self.is_connected():
+            return None
+        try:
+            value = self.client.get(key)
+            if value and value.startswith(('{', '[')):
+                return orjson.loads(value)
+            return value
+        except (RedisError, ValueError) as e:
+            logger.error("Error reading %s from Redis: %s", key, e)
+            self._failed(e)
+            return None
+
+    def set(self, key, value, ttl=None):
+        """Set a value, encoding dicts and lists as JSON. Returns True on success."""
+        if not self.is_connected():
+            return False
+        try:
+            if isinstance(value, (dict, list)):
+                value = orjson.dumps(value)
+            self.client.set(key, value, ex=ttl)
+            return True
+        except (RedisError, TypeError) as e:
+            logger.error("Error writing %s to Redis: %s", key, e)
+            self._failed(e)
+            return False
+
+    @contextmanager
+    def pipeline(self):
+        """Yield a pipeline whose queued commands are sent in one round trip on exit.
+
+        Yields None when Redis is unavailable. Pass it as `pipe` to delete() or
+        push_capped() to queue those calls instead of sending them.
+        """
+        if not self.is_connected():
+            yield None
+            return
+        pipe = self.client.pipeline()
+        try:
+            yield pipe
+            # Only reached when the block finished; an error in it discards the queued commands
+            pipe.execute()
+        except RedisError as e:
+            logger.error("Error running Redis pipeline: %s", e)
+            self._failed(e)
+        finally:
+            pipe.reset()
+
+    def delete(self, *keys, pipe=None):
+        """Delete one or more keys. Returns True on success (or once queued on pipe)."""
+        if keys and pipe is not None:
+            pipe.delete(*keys)
+            return True
+        if not keys or not self.is_connected():
+            return False
+        try:
+            self.client.delete(*keys)
+            return True
+        except RedisError as e:
+            logger.error("Error deleting %s from Redis: %s", keys, e)
+            self._failed(e)
+            return False
+
+    def push_capped(self, key, value, maxlen, ttl=None, pipe=None):
+        """Append to a list, keeping only its last maxlen items. Returns True on success (or once queued on pipe)."""
+        if pipe is None and not self.is_connected():
+            return False
+        try:
+            if isinstance(value, (dict, list)):
+                value = orjson.dumps(value)
+            batch = pipe if pipe is not None else self.client.pipeline()
+            batch.rpush(key, value)
+            batch.ltrim(key, -maxlen, -1)
+            if ttl:
+                batch.expire(key, ttl)
+            if pipe is None:
+                batch.execute()
+            return True
+        except (RedisError, TypeError) as e:
+            logger.error("Error appending to %s in Redis: %s", key, e)
+            self._failed(e)
+            return False
+
+    def get_list(self, key):
+        """Get a whole list, decoding JSON items. Returns None if Redis is unavailable."""
+        if not self.is_connected():
+            return None
+        try:
+            return [orjson.loads(item) if item.startswith(('{', '[')) else item
+                    for item in self.client.lrange(key, 0, -1)]
+        except (RedisError, ValueError) as e:
+            logger.error("Error reading %s from Redis: %s", key, e)
+            self._failed(e)
+            return None
+
+    def claim(self, key, ttl):
+        """Set key only if it is absent. True if this caller got it, or if Redis is unavailable."""
+        if not self.is_connected():
+            return True
+        try:
+            return bool(self.client.set(key, 1, nx=True, ex=ttl))
+        except RedisError as e:
+            logger.error("Error claiming %s in Redis: %s", key, e)
+            self._failed(e)
+            return True
+
+    def exists(self, key):
+        """Check whether a key exists."""
+        if not self.is_connected():
+            return False
+        try:
+            return bool(self.client.exists(key))
+        except RedisError as e:
+            logger.error("Error checking %s in Redis: %s", key, e)
+            self._failed(e)
+            return False
+
+redis_client = RedisClient(REDIS_URL)
@@ -1,33 +1,65 @@
 import os
 from dotenv import load_dotenv
 
+# Render Configuration
+IS_RENDER = os.environ.get("RENDER", "") == "true"
+
 # Only load the .env file if we're not on Render (i.e., we are in a local environment)
-if os.environ.get("RENDER") != "true":
+if not IS_RENDER:
     load_dotenv()
 
 # Flask Configuration
 SECRET_KEY = os.getenv('SECRET_KEY', 'a_very_secret_key_that_should_be_changed')
-CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
+def _parse_origins(value):
+    """Turn a comma-separated CORS_ORIGINS value into '*' or a list of origins."""
+    origins = [origin.strip() for origin in value.split(',') if origin.strip()]
+    return '*' if not origins or '*' in origins else origins
+
+CORS_ORIGINS = _parse_origins(os.getenv('CORS_ORIGINS', '*'))
 
 # Database Configuration
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///local.db')
 
+# Connection pool for server databases (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 20))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 30))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+# Redis Configuration (optional): Socket.IO message queue and lobby cache
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Identifies the running release so workers of one deployment reset the database
+# only once; Render sets RENDER_GIT_COMMIT, elsewhere set DEPLOY_ID
+DEPLOY_ID = os.getenv('DEPLOY_ID') or os.getenv('RENDER_GIT_COMMIT')
+
+# Socket.IO concurrency: 'eventlet' (default, green threads for many sockets) or
+# 'threading' (OS threads; simpler with blocking libraries, fewer connections)
+SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'eventlet').lower()
+
+# Socket.IO wire format: 'json' (default) or 'msgpack' for smaller binary frames
+SOCKETIO_SERIALIZER = os.getenv('SOCKETIO_SERIALIZER', 'json').lower()
+
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Debug environment variable loading
-if os.environ.get("RENDER") == "true":
-    print(f"Running on Render - RENDER env var: {os.environ.get('RENDER')}")
+if IS_RENDER:
+    print("Running on Render")
     print(f"OPENAI_API_KEY present: {'Yes' if OPENAI_API_KEY else 'No'}")
     if OPENAI_API_KEY:
         print(f"OPENAI_API_KEY starts with: {OPENAI_API_KEY[:7]}...")
 else:
-    print(f"Running locally - RENDER env var: {os.environ.get('RENDER')}")
+    print("Running locally")
     print(f"OPENAI_API_KEY present: {'Yes' if OPENAI_API_KEY else 'No'}")
 
 # Server Configuration
 PORT = int(os.getenv('PORT', 5000))
-DEBUG = os.environ.get('RENDER', '') != 'true'
+DEBUG = not IS_RENDER
 
-# Render Configuration
-IS_RENDER = os.environ.get("RENDER", "") == "true" 
\ No newline at end of file
+# Logging: LOG_LEVEL for the app; per-packet Socket.IO/Engine.IO logs only when asked for
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+SOCKETIO_LOGGING = os.getenv('SOCKETIO_LOGGING', 'false').lower() == 'true'
+
+# Log 1 in N connects/disconnects at INFO (every one in local development)
+CONNECTION_LOG_SAMPLE = 1 if DEBUG else int(os.getenv('CONNECTION_LOG_SAMPLE', 100))
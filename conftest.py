@@ -0,0 +1,61 @@
+"""Shared pytest setup: an in-memory database and a Socket.IO stand-in that records emits."""
+
+import os
+
+# Must be set before models.database creates its engine
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.pop('REDIS_URL', None)
+
+import pytest
+from models.database import SessionLocal, Player, get_lobby, clear_game_tables
+
+
+class RecordingSocketIO:
+    """Collects emits; background tasks are recorded instead of started."""
+
+    def __init__(self):
+        self.emitted = []
+        self.tasks = []
+
+    def emit(self, event, data=None, room=None, **kwargs):
+        self.emitted.append((event, data, room))
+
+    def start_background_task(self, fn, *args, **kwargs):
+        self.tasks.append((fn, args, kwargs))
+
+    def sleep(self, seconds):
+        pass
+
+    def close_room(self, room):
+        pass
+
+    def events(self, name):
+        """(data, room) for every emit of one event, oldest first."""
+        return [(data, room) for event, data, room in self.emitted if event == name]
+
+
+@pytest.fixture
+def socketio():
+    return RecordingSocketIO()
+
+
+@pytest.fixture
+def session():
+    clear_game_tables()
+    session = SessionLocal()
+    yield session
+    session.close()
+    clear_game_tables()
+
+
+@pytest.fixture
+def add_players(session):
+    """Add players to the main lobby: add_players('alice', 'bob', ai='Bot')."""
+    def add(*usernames, ai=None):
+        lobby = get_lobby(session, 'main')
+        names = [(name, False) for name in usernames] + ([(ai, True)] if ai else [])
+        players = [Player(sid=f"sid-{name}", username=name, is_ai=is_ai, lobby=lobby) for name, is_ai in names]
+        session.add_all(players)
+        session.commit()
+        return players
+    return add
@@ -1,14 +1,99 @@
 import random
-import threading
+import re
 import time
 import logging
+import httpx
 from openai import OpenAI
 from config.settings import OPENAI_API_KEY
-from utils.constants import AI_NAMES, LOCATIONS
-from models.database import Player
+from utils.constants import AI_NAMES, AI_NAMES_SET, LOCATIONS
+from utils.tasks import run_after, Prefetch
+from utils.lru import LRUDict
+from models.database import Player, with_session
 
 logger = logging.getLogger(__name__)
 
+# Canned lines used when the OpenAI call fails; {target} is the player being asked
+AI_FALLBACK_QUESTIONS = (
+    "What's your favorite thing about this place?",
+    "{target}, what would you usually be doing here?",
+    "What's the first thing you notice when you arrive?",
+    "{target}, who else would you expect to run into here?",
+)
+AI_FALLBACK_ANSWERS = (
+    "It's pretty nice here.",
+    "Honestly, it depends on the day.",
+    "I'd say it's busier than people expect.",
+    "You get used to it after a while.",
+)
+
+def _location_key(text):
+    """Letters only, lowercased, so 'Cruise ship.' and 'cruise-ship' compare equal."""
+    return re.sub(r'[^a-z]', '', text.lower())
+
+# Normalized location -> canonical name, for matching free-form model replies
+LOCATIONS_BY_KEY = {_location_key(loc): loc for loc in LOCATIONS}
+
+NO_GUESS_REPLIES = frozenset(("no guess", "not sure", "i don't know", "i don't have enough information"))
+
+# A question repeated within one game reuses the AI's last reply for this window. Keyed per
+# game: the same word-for-word answer across games would give the AI away.
+AI_ANSWER_CACHE_TTL = 300
+_answer_cache = LRUDict(500)  # (room, game generation, normalized question) -> (expires_at, answer)
+
+# System prompts. They are built once here; per call only the placeholders are filled in.
+ANSWER_SYSTEM_PROMPT = """You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
+        You are the AI outsider who doesn't know the location, but you MUST pretend that you do know it.
+        When answering questions, act like you know the location and give short, confident answers.
+        Be vague but convincing - don't give away that you're guessing.
+        Keep your answer short (1 sentence max) and natural."""
+
+# {target_name} is the player being asked
+QUESTION_SYSTEM_PROMPT = """You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
+        You are the AI outsider who doesn't know the location. You are asking a question to {target_name} to try to figure out which Spyfall location they know.
+        Ask a strategic question that could reveal which specific location they're thinking of.
+        Focus on: activities, people, objects, atmosphere, sounds, smells, or unique features of Spyfall locations.
+        Keep the question short and natural. Don't reveal that you don't know the location."""
+
+# Guess prompts take the Q&A {context} and the latest {question}/{answer}
+FORCED_GUESS_PROMPT = """You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
+            
+            You are the AI outsider who doesn't know the location. You have reached question 3 and MUST make your best educated guess.
+            
+            Available Spyfall locations: {locations}
+            
+            Previous conversation:
+            {context}
+            
+            Latest Q&A:
+            Q: {question}
+            A: {answer}
+            
+            Based on ALL the clues from the questions and answers, which Spyfall location do you think the other players know? 
+            You MUST choose from the available locations: {locations}
+            Look for clues about: activities, people, objects, atmosphere, sounds, smells, or unique features.
+            Do not say "I don't know" or "not sure" - make your best educated guess based on the conversation.
+            If you see ANY location-related clues, use them to make your guess.
+            
+            IMPORTANT: Return ONLY the location name from the list, nothing else.""".replace('{locations}', ', '.join(LOCATIONS))
+
+REGULAR_GUESS_PROMPT = """You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
+            
+            You are the AI outsider who doesn't know the location. Based on the conversation so far, can you guess which Spyfall location the other players know?
+            
+            Available Spyfall locations: {locations}
+            
+            Previous conversation:
+            {context}
+            
+            Latest Q&A:
+            Q: {question}
+            A: {answer}
+            
+            Based on all this information, can you guess which Spyfall location the other players know? If you see ANY clues, what is your best guess from the available options? If absolutely no clues, say "NO_GUESS".""".replace('{locations}', ', '.join(LOCATIONS))
+
+# Connections kept open to the OpenAI API; about one per room with an AI turn in flight
+OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=20)
+
 # Initialize client lazily to avoid import-time issues
 _client = None
 
@@ -19,10 +104,15 @@ def get_openai_client():
         try:
             if not OPENAI_API_KEY:
                 raise ValueError("OPENAI_API_KEY environment variable is not set")
-            # Set a longer timeout (20 seconds) to handle slow cold starts on Render
-            _client = OpenAI(api_key=OPENAI_API_KEY, timeout=20.0)
+            # Set a longer timeout (20 seconds) to handle slow cold starts on Render.
+            # One shared keep-alive pool lets AI turns skip the TLS handshake.
+            _client = OpenAI(
+                api_key=OPENAI_API_KEY,
+                timeout=20.0,
+                http_client=httpx.Client(limits=OPENAI_HTTP_LIMITS)
+            )
         except Exception as e:
-            logger.error(f"Error initializing OpenAI client: {e}")
+            logger.error("Error initializing OpenAI client: %s", e)
             # Return a mock client for development/testing
             class MockClient:
                 def __init__(self):
@@ -45,44 +135,60 @@ def get_openai_client():
             _client = MockClient()
     return _client
 
-def get_random_ai_name():
-    """Get a random AI name."""
-    return random.choice(AI_NAMES)
+def get_random_ai_name(taken=(), rng=random):
+    """Get a random AI name that no player in the lobby is already using."""
+    available = AI_NAMES_SET.difference(taken)
+    return rng.choice(sorted(available) if available else AI_NAMES)
+
+def _normalize_question(question):
+    """Cache key for a question: case, spacing and trailing punctuation don't change the answer."""
+    return ' '.join(question.lower().split()).rstrip('?!. ')
+
+def match_location(guess):
+    """Return the location a model reply names ('I think the Hotel.' -> 'Hotel'), or None."""
+    key = _location_key(guess)
+    if key in LOCATIONS_BY_KEY:
+        return LOCATIONS_BY_KEY[key]
+    for loc_key, loc in LOCATIONS_BY_KEY.items():
+        if loc_key in key:
+            return loc
+    return None
+
+def generate_ai_response(question, location, is_outsider, game=None, rng=random):
+    """Generate an AI response to a question.
 
-def generate_ai_response(question, location, is_outsider):
-    """Generate an AI response to a question."""
+    With game=(room, generation), a recent answer to the same question in that game is reused.
+    """
+    key = (*game, _normalize_question(question)) if game else None
+    cached = _answer_cache.get(key) if key else None
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
     try:
         # AI is always the outsider but must pretend to know the location
-        system_prompt = f"""You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
-        You are the AI outsider who doesn't know the location, but you MUST pretend that you do know it.
-        When answering questions, act like you know the location and give short, confident answers.
-        Be vague but convincing - don't give away that you're guessing.
-        Keep your answer short (1 sentence max) and natural."""
 
         response = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
                 {"role": "user", "content": f"Question: {question}"}
             ],
             max_tokens=30,
             temperature=0.7,
             timeout=10  # Add timeout to prevent hanging
         )
-        return response.choices[0].message.content.strip()
+        answer = response.choices[0].message.content.strip()
+        if key:
+            _answer_cache[key] = (time.monotonic() + AI_ANSWER_CACHE_TTL, answer)
+        return answer
     except Exception as e:
-        logger.error(f"Error generating AI response: {e}")
+        logger.error("Error generating AI response: %s", e)
         # Return a quick fallback response instead of hanging
-        return "It's pretty nice here."
+        return rng.choice(AI_FALLBACK_ANSWERS)
 
-def generate_ai_question(target_name):
+def generate_ai_question(target_name, rng=random):
     """Generate an AI question for a target player."""
     try:
-        system_prompt = f"""You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
-        You are the AI outsider who doesn't know the location. You are asking a question to {target_name} to try to figure out which Spyfall location they know.
-        Ask a strategic question that could reveal which specific location they're thinking of.
-        Focus on: activities, people, objects, atmosphere, sounds, smells, or unique features of Spyfall locations.
-        Keep the question short and natural. Don't reveal that you don't know the location."""
+        system_prompt = QUESTION_SYSTEM_PROMPT.format(target_name=target_name)
 
         response = get_openai_client().chat.completions.create(
             model="gpt-4o",
@@ -96,330 +202,378 @@ def generate_ai_question(target_name):
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
-        logger.error(f"Error generating AI question: {e}")
+        logger.error("Error generating AI question: %s", e)
         # Return a quick fallback question
-        return f"What's your favorite thing about this place?"
+        return rng.choice(AI_FALLBACK_QUESTIONS).format(target=target_name)
 
-def ai_vote_random(players, ai_sid):
+def ai_vote_random(players, ai_sid, rng=random):
     """AI votes for a random player (excluding itself), never passes."""
     # Only vote for human players (never pass)
     human_players = [p for p in players if p.sid != ai_sid and not p.is_ai]
     if human_players:
-        choice = random.choice(human_players)
+        choice = rng.choice(human_players)
         return choice.sid
     return None
 
-def ai_ask_question_with_delay(socketio, lobby, asker_sid, target_sid, location, game_manager=None, delay=3):
-    """AI asks a question after a delay."""
-    def delayed_question():
-        socketio.sleep(delay)
-        from models.database import SessionLocal, get_player_by_sid, get_players
-        session = SessionLocal()
-        try:
-            # Pause inactivity timer during AI operation
-            if game_manager:
-                game_manager.pause_inactivity_timer()
-            
-            ai_player = get_player_by_sid(session, lobby, asker_sid)
-            if not ai_player or not ai_player.is_ai:
-                logger.error(f"Error: AI player not found for asker_sid {asker_sid}")
-                return
-            target_player = get_player_by_sid(session, lobby, target_sid)
-            target_name = target_player.username if target_player else "Unknown"
-            question = generate_ai_question(target_name)
-            question_data = {
-                'asker': ai_player.username,
-                'target': target_name,
-                'question': question,
-                'asker_sid': ai_player.sid,
-                'target_sid': target_sid
+def _load_lobby(room, with_players=False):
+    """Read a lobby in a short session of its own and return it detached.
+
+    The AI tasks hold no session, and so no pooled connection, across an OpenAI
+    call; reading again afterwards gives the current row, not the one seen before.
+    """
+    from models.database import get_db, get_lobby
+    with get_db() as session:
+        return get_lobby(session, room, with_players=with_players)
+
+def _game_moved_on(lobby, is_current, states=('playing',)):
+    """True if the room was reset, or its game left `states`, while the AI waited on OpenAI.
+
+    Pass a lobby read after the OpenAI call (see _load_lobby).
+    """
+    return (is_current is not None and not is_current()) or lobby.state not in states
+
+def ai_ask_question_with_delay(socketio, room, asker_sid, target_sid, location, game_manager=None, delay=3,
+                               target_name=None):
+    """AI asks a question after a delay.
+
+    When the target's name is known the question is generated during the delay.
+    """
+    is_current = game_manager.current_game_check(room) if game_manager else None
+    rng = game_manager.game_rng(room) if game_manager else random
+    pending = Prefetch(socketio, generate_ai_question, target_name, rng) if target_name else None
+    run_after(socketio, delay, run_ai_question, socketio, room, asker_sid, target_sid, game_manager, pending,
+              is_current=is_current)
+
+def run_ai_question(socketio, room, asker_sid, target_sid, game_manager=None, pending_question=None):
+    """Have the AI ask its question and hand the turn to the target."""
+    from game.logic import players_room
+    is_current = game_manager.current_game_check(room) if game_manager else None
+    try:
+        # Pause inactivity timer during AI operation
+        if game_manager:
+            game_manager.pause_inactivity_timer(room)
+        
+        # One query for the lobby and its players; every lookup below is a dict hit
+        lobby = _load_lobby(room, with_players=True)
+        players = lobby.players
+        by_sid = {p.sid: p for p in players}
+        ai_player = by_sid.get(asker_sid)
+        if not ai_player or not ai_player.is_ai:
+            logger.error("Error: AI player not found for asker_sid %s", asker_sid)
+            return
+        target_player = by_sid.get(target_sid)
+        ai_name = ai_player.username
+        target_name = target_player.username if target_player else "Unknown"
+        target_is_human = target_player is not None and not target_player.is_ai
+        total_players = len(players)
+        if pending_question:
+            question = pending_question.result()
+        else:
+            question = generate_ai_question(target_name, game_manager.game_rng(room) if game_manager else random)
+        lobby = _load_lobby(room)
+        if (_game_moved_on(lobby, is_current) or lobby.current_question_asker != asker_sid
+                or lobby.current_target != target_sid):
+            logger.info("Game moved on while AI %s was thinking; dropping its question", ai_name)
+            return
+        if game_manager:
+            game_manager.record_question(room, question)
+        question_data = {
+            'asker': ai_name,
+            'target': target_name,
+            'question': question,
+            'asker_sid': asker_sid,
+            'target_sid': target_sid
+        }
+        logger.info("AI %s asking question: %s", ai_name, question)
+        logger.info("Emitting question_asked event: %s", question_data)
+        # The players room holds exactly the human players (the AI has no socket), so one
+        # room emit reaches them all and the packet is encoded once
+        socketio.emit('question_asked', question_data, room=players_room(room))
+        logger.info("Event data sent: asker=%s, target=%s, question=%s", question_data['asker'], question_data['target'], question_data['question'])
+        logger.info("AI %s asked: %s", ai_name, question)
+        
+        # Send turn_update to the human player to tell them it's their turn to answer
+        if target_is_human:
+            turn_data = {
+                'current_asker': ai_name,
+                'current_target': target_name,
+                'is_my_turn_to_ask': False,
+                'is_my_turn_to_answer': True,
+                'can_ask': False,
+                'can_answer': True,
+                'turn': lobby.turn + 1,
+                'total_players': total_players
             }
-            logger.info(f"AI {ai_player.username} asking question: {question}")
-            logger.info(f"Emitting question_asked event: {question_data}")
-            players = get_players(session, lobby)
-            human_players = [p for p in players if not p.is_ai]
-            logger.info(f"Found {len(human_players)} human players to send to")
-            for player in human_players:
-                logger.info(f"  Sending to {player.username} (SID: {player.sid})")
-                socketio.emit('question_asked', question_data, room=player.sid)
-            logger.info(f"question_asked event emitted to all human SIDs")
-            logger.info(f"Event data sent: asker={question_data['asker']}, target={question_data['target']}, question={question_data['question']}")
-            logger.info(f"AI {ai_player.username} asked: {question}")
-            
-            # Send turn_update to the human player to tell them it's their turn to answer
-            if target_player and not target_player.is_ai:
-                turn_data = {
-                    'current_asker': ai_player.username,
-                    'current_target': target_player.username,
-                    'is_my_turn_to_ask': False,
-                    'is_my_turn_to_answer': True,
-                    'can_ask': False,
-                    'can_answer': True,
-                    'turn': lobby.turn + 1,
-                    'total_players': len(players)
-                }
-                logger.info(f"DEBUG: Sending turn_update to {target_player.username} (SID: {target_sid})")
-                logger.info(f"DEBUG: Turn data: {turn_data}")
-                socketio.emit('turn_update', turn_data, room=target_sid)
-                logger.info(f"DEBUG: Turn update sent to {target_player.username}")
+            logger.debug("Sending turn_update to %s (SID: %s)", target_name, target_sid)
+            logger.debug("Turn data: %s", turn_data)
+            socketio.emit('turn_update', turn_data, room=target_sid)
+            logger.debug("Turn update sent to %s", target_name)
             
-            # Resume inactivity timer after AI operation
-            if game_manager:
-                game_manager.resume_inactivity_timer()
-                
-        except Exception as e:
-            logger.error(f"Error in AI question: {e}")
-            # Resume inactivity timer even on error
-            if game_manager:
-                game_manager.resume_inactivity_timer()
-        finally:
-            session.close()
-    socketio.start_background_task(delayed_question)
-
-def ai_answer_with_delay(socketio, lobby, target_sid, question, location, game_manager=None, delay=2):
-    """AI answers a question after a delay."""
-    def delayed_answer():
-        socketio.sleep(delay)
-        from models.database import SessionLocal, get_player_by_sid, get_players, get_messages
-        session = SessionLocal()
-        try:
-            # Pause inactivity timer during AI operation
+    except Exception as e:
+        logger.error("Error in AI question: %s", e)
+    finally:
+        # Resume inactivity timer after AI operation, including early returns and errors
+        if game_manager:
+            game_manager.resume_inactivity_timer(room)
+
+def qa_pairs_from_messages(messages):
+    """Rebuild the game's Q&A pairs from its chat messages."""
+    qa_pairs = []
+    
+    # Parse messages to extract Q&A pairs
+    for msg in messages:
+        if "asks" in msg.content and ":" in msg.content:
+            # This is a question
+            parts = msg.content.split(" asks ")
+            if len(parts) == 2:
+                asker = parts[0]
+                rest = parts[1]
+                if ":" in rest:
+                    target_and_q = rest.split(": ")
+                    if len(target_and_q) == 2:
+                        target = target_and_q[0]
+                        q_text = target_and_q[1]
+                        qa_pairs.append({
+                            'question': q_text,
+                            'answer': None  # Will be filled by next message
+                        })
+        elif "answers:" in msg.content and qa_pairs:
+            # This is an answer to the last question
+            parts = msg.content.split(" answers: ")
+            if len(parts) == 2:
+                answer_text = parts[1]
+                if qa_pairs and qa_pairs[-1]['answer'] is None:
+                    qa_pairs[-1]['answer'] = answer_text
+    return qa_pairs
+
+def ai_answer_with_delay(socketio, room, target_sid, question, location, game_manager=None, delay=2):
+    """AI answers a question after a delay; the answer is generated during the delay."""
+    is_current = game_manager.current_game_check(room) if game_manager else None
+    game = (room, game_manager.get_game_generation(room)) if game_manager else None
+    rng = game_manager.game_rng(room) if game_manager else random
+    pending = Prefetch(socketio, generate_ai_response, question, location, True, game, rng)  # AI is always outsider
+    run_after(socketio, delay, run_ai_answer, socketio, room, target_sid, question, location, game_manager, pending,
+              is_current=is_current)
+
+@with_session
+def run_ai_answer(socketio, room, target_sid, question, location, game_manager=None, pending_answer=None):
+    """Generate and broadcast the AI's answer, then guess the location and advance the turn.
+
+    Takes only plain values so it can run on any worker; the lobby is loaded fresh here.
+    The turn progression at the end shares one session, opened after the last OpenAI call.
+    """
+    from models.database import get_db, get_messages
+    from game.logic import players_room, QA_HISTORY_SIZE
+    is_current = game_manager.current_game_check(room) if game_manager else None
+    try:
+        # Pause inactivity timer during AI operation
+        if game_manager:
+            game_manager.pause_inactivity_timer(room)
+        
+        lobby = _load_lobby(room, with_players=True)
+        players = lobby.players
+        ai_player = next((p for p in players if p.sid == target_sid), None)
+        if not ai_player or not ai_player.is_ai:
+            logger.error("Error: AI player not found for target_sid %s", target_sid)
+            return
+        ai_name = ai_player.username
+        logger.debug("AI %s starting to answer question: %s", ai_name, question)
+        if pending_answer:
+            answer = pending_answer.result()
+        else:
+            game = (room, game_manager.get_game_generation(room)) if game_manager else None
+            rng = game_manager.game_rng(room) if game_manager else random
+            answer = generate_ai_response(question, location, True, game, rng)  # AI is always outsider
+        lobby = _load_lobby(room)
+        if _game_moved_on(lobby, is_current, ('playing', 'voting')):
+            logger.info("Game moved on while AI %s was thinking; dropping its answer", ai_name)
+            return
+        ai_answer_data = {
+            'answer': answer,
+            'question': question,
+            'target': ai_name,
+            'target_sid': target_sid
+        }
+        logger.info("AI %s answering: %s", ai_name, answer)
+        if game_manager:
+            game_manager.record_answer(room, answer, question)
+        socketio.emit('ai_answer', ai_answer_data, room=players_room(room))
+        logger.info("AI %s answered: %s", ai_name, answer)
+        
+        # AI is always the outsider, so always try to guess the location
+        logger.debug("AI %s is outsider, attempting location guess...", ai_name)
+        
+        # Check if game is already in voting state - if so, skip location guess
+        if lobby.state == 'voting':
+            logger.debug("Game is in voting state, skipping location guess")
+            # Just handle turn progression without location guess
             if game_manager:
-                game_manager.pause_inactivity_timer()
-            
-            ai_player = get_player_by_sid(session, lobby, target_sid)
-            if not ai_player or not ai_player.is_ai:
-                logger.error(f"Error: AI player not found for target_sid {target_sid}")
-                return
-            logger.info(f"DEBUG: AI {ai_player.username} starting to answer question: {question}")
-            answer = generate_ai_response(question, location, True)  # AI is always outsider
-            ai_answer_data = {
-                'answer': answer,
-                'question': question,
-                'target': ai_player.username,
-                'target_sid': target_sid
-            }
-            logger.info(f"AI {ai_player.username} answering: {answer}")
-            players = get_players(session, lobby)
-            human_players = [p for p in players if not p.is_ai]
-            logger.info(f"Found {len(human_players)} human players to send to")
-            for player in human_players:
-                logger.info(f"  Sending ai_answer to {player.username} (SID: {player.sid})")
-                socketio.emit('ai_answer', ai_answer_data, room=player.sid)
-            logger.info(f"AI {ai_player.username} answered: {answer}")
-            
-            # AI is always the outsider, so always try to guess the location
-            logger.info(f"DEBUG: AI {ai_player.username} is outsider, attempting location guess...")
-            
-            # Check if game is already in voting state - if so, skip location guess
-            if lobby.state == 'voting':
-                logger.info(f"DEBUG: Game is in voting state, skipping location guess")
-                # Just handle turn progression without location guess
-                if game_manager:
-                    _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, lobby.room)
-                return
-            
-            # Get previous Q&A pairs from the game
-            messages = get_messages(session, lobby)
-            qa_pairs = []
-            
-            # Parse messages to extract Q&A pairs
-            for msg in messages:
-                if "asks" in msg.content and ":" in msg.content:
-                    # This is a question
-                    parts = msg.content.split(" asks ")
-                    if len(parts) == 2:
-                        asker = parts[0]
-                        rest = parts[1]
-                        if ":" in rest:
-                            target_and_q = rest.split(": ")
-                            if len(target_and_q) == 2:
-                                target = target_and_q[0]
-                                q_text = target_and_q[1]
-                                qa_pairs.append({
-                                    'question': q_text,
-                                    'answer': None  # Will be filled by next message
-                                })
-                elif "answers:" in msg.content and qa_pairs:
-                    # This is an answer to the last question
-                    parts = msg.content.split(" answers: ")
-                    if len(parts) == 2:
-                        answer_text = parts[1]
-                        if qa_pairs and qa_pairs[-1]['answer'] is None:
-                            qa_pairs[-1]['answer'] = answer_text
-            
-            # Add current Q&A pair
+                _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, room,
+                                                   is_current=is_current)
+            return
+        
+        # Q&A pairs so far, including this one. They come from memory, or from Redis when
+        # workers share the game; only if Redis is unreachable are they rebuilt from the chat log.
+        qa_pairs = game_manager.get_qa_history(room) if game_manager else None
+        if qa_pairs is None:
+            # A Q&A pair is two messages; leave room for the votes and joins in between
+            with get_db() as session:
+                messages = get_messages(session, lobby, limit=4 * QA_HISTORY_SIZE)
+            qa_pairs = qa_pairs_from_messages(messages)
             qa_pairs.append({
                 'question': question,
                 'answer': answer
             })
-            
-            logger.info(f"DEBUG: AI analyzing {len(qa_pairs)} Q&A pairs for location guess")
+            # Same window as the in-memory history so the prompt stays small in long games
+            qa_pairs = qa_pairs[-QA_HISTORY_SIZE:]
+        
+        logger.debug("AI analyzing %s Q&A pairs for location guess", len(qa_pairs))
+        if logger.isEnabledFor(logging.DEBUG):
             for i, qa in enumerate(qa_pairs):
-                logger.info(f"DEBUG: Q&A {i+1}: Q='{qa['question']}' A='{qa['answer']}'")
-            
-            # Generate location guess - include ALL Q&A pairs including current one
-            location_guess = generate_location_guess(question, answer, qa_pairs, location, lobby.question_count + 1)
+                logger.debug("Q&A %s: Q='%s' A='%s'", i + 1, qa['question'], qa['answer'])
+        
+        # Generate location guess - include ALL Q&A pairs including current one
+        question_number = lobby.question_count + 1
+        location_guess = generate_location_guess(question, answer, qa_pairs, location, question_number)
+        lobby = _load_lobby(room)
+        if _game_moved_on(lobby, is_current, ('playing', 'voting')):
+            logger.info("Game moved on while AI %s was guessing; dropping its guess", ai_name)
+            return
+        
+        if location_guess:
+            logger.debug("AI %s guessing location: %s", ai_name, location_guess)
+            logger.debug("Actual location: %s", location)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Location guess type: %s, length: %s", type(location_guess), len(location_guess))
+                logger.debug("Actual location type: %s, length: %s", type(location), len(location))
+                logger.debug("Location guess matches: %s", match_location(location_guess))
+            
+            # Check if guess is correct
+            is_correct = match_location(location_guess) == location
+            logger.debug("Location comparison result: %s", is_correct)
+            
+            # Anonymous location guess for the chat
+            guess_message = f"Someone guessed the location: {location_guess}"
+            guess_data = {
+                'guess': location_guess,
+                'message': guess_message,
+                'is_correct': is_correct
+            }
             
-            if location_guess:
-                logger.info(f"DEBUG: AI {ai_player.username} guessing location: {location_guess}")
-                logger.info(f"DEBUG: Actual location: {location}")
-                logger.info(f"DEBUG: Location guess type: {type(location_guess)}, length: {len(location_guess)}")
-                logger.info(f"DEBUG: Actual location type: {type(location)}, length: {len(location)}")
-                logger.info(f"DEBUG: Location guess lower: '{location_guess.lower()}'")
-                logger.info(f"DEBUG: Actual location lower: '{location.lower()}'")
-                
-                # Check if guess is correct
-                is_correct = location_guess.lower() == location.lower()
-                logger.info(f"DEBUG: Location comparison result: {is_correct}")
-                
-                # Add anonymous location guess to chat with appropriate emoji
-                from models.database import add_message
-                emoji = "🎯" if is_correct else "❌"
-                guess_message = f"Someone guessed the location: {location_guess}"
-                add_message(session, lobby, guess_message)
-                
-                # Send anonymous guess to all players
-                socketio.emit('location_guess_made', {
-                    'guess': location_guess,
-                    'message': guess_message,
-                    'is_correct': is_correct
-                }, room=lobby.room)
-                
-                if is_correct:
-                    logger.info(f"DEBUG: AI {ai_player.username} correctly guessed the location!")
-                    logger.info(f"DEBUG: Calling game_manager.end_game with winner='ai'")
-                    # AI wins by guessing the location
-                    if game_manager:
-                        game_manager.end_game(lobby.room, "ai", f"Someone correctly guessed the location: {location}! The AI wins!")
-                    else:
-                        logger.error(f"ERROR: game_manager is None, cannot end game!")
+            if is_correct:
+                logger.debug("AI %s correctly guessed the location!", ai_name)
+                logger.debug("Calling game_manager.end_game with winner='ai'")
+                # AI wins by guessing the location
+                if game_manager:
+                    game_manager.end_game(room, "ai", f"Someone correctly guessed the location: {location}! The AI wins!",
+                                          location_guess=guess_data)
                 else:
-                    logger.info(f"DEBUG: AI {ai_player.username} guessed wrong: {location_guess} vs {location}")
-                    # Wrong guess - continue game
-                    if game_manager:
-                        # Handle turn progression manually to avoid immediate voting
-                        _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, lobby.room)
+                    logger.error("ERROR: game_manager is None, cannot end game!")
             else:
-                logger.info(f"DEBUG: AI {ai_player.username} not confident enough to guess")
-                # No guess - continue game
+                logger.debug("AI %s guessed wrong: %s vs %s", ai_name, location_guess, location)
+                # Wrong guess - continue game
                 if game_manager:
-                    # Handle turn progression manually to avoid immediate voting
-                    _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, lobby.room)
-            
-            # Resume inactivity timer after AI operation
-            if game_manager:
-                game_manager.resume_inactivity_timer()
-            
-        except Exception as e:
-            logger.error(f"Error in AI answer: {e}")
-            # Resume inactivity timer even on error
+                    # Handle turn progression manually to avoid immediate voting; the
+                    # guess rides along in its question_count_update instead of its own frame
+                    _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, room, guess_data,
+                                                       is_current=is_current)
+        else:
+            logger.debug("AI %s not confident enough to guess", ai_name)
+            # No guess - continue game
             if game_manager:
-                game_manager.resume_inactivity_timer()
-        finally:
-            session.close()
-    socketio.start_background_task(delayed_answer)
-
-def _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, room):
-    """Handle turn progression for AI answers, ensuring location guesses happen before voting."""
-    from models.database import SessionLocal, get_player_by_sid, add_message, get_lobby
-    session = SessionLocal()
+                # Handle turn progression manually to avoid immediate voting
+                _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, room,
+                                                   is_current=is_current)
+        
+    except Exception as e:
+        logger.error("Error in AI answer: %s", e)
+    finally:
+        # Resume inactivity timer after AI operation, including early returns and errors
+        if game_manager:
+            game_manager.resume_inactivity_timer(room)
+
+def _handle_ai_answer_turn_progression(game_manager, lobby, answer, target_sid, room, guess=None, is_current=None):
+    """Handle turn progression for AI answers, ensuring location guesses happen before voting.
+
+    A wrong location guess is passed as `guess` and sent with the question count update.
+    """
+    from models.database import get_db_session, close_db_session, add_message, get_lobby
+    session = get_db_session()
     try:
-        # Get a fresh lobby object in this session
-        fresh_lobby = get_lobby(session, room)
+        # Current row, read after the OpenAI calls
+        fresh_lobby = get_lobby(session, room, fresh=True)
         if not fresh_lobby:
-            logger.error(f"ERROR: Could not find lobby for room {room}")
+            logger.error("ERROR: Could not find lobby for room %s", room)
+            return
+        if _game_moved_on(fresh_lobby, is_current, ('playing', 'voting')):
+            logger.info("Game in %s moved on during the AI answer; not advancing the turn", room)
             return
         
         # Add the AI answer to the database
-        target = get_player_by_sid(session, fresh_lobby, target_sid)
+        target = game_manager.get_player_info(session, fresh_lobby, target_sid)
         if target:
-            message = f"{target.username} answers: {answer}"
-            add_message(session, fresh_lobby, message)
+            message = f"{target[0]} answers: {answer}"
+            add_message(session, fresh_lobby, message, commit=False)  # committed with the question count
+        if guess:
+            add_message(session, fresh_lobby, guess['message'], commit=False)
         
         # Increment question count
         fresh_lobby.question_count += 1
-        logger.info(f"DEBUG: Question count incremented to {fresh_lobby.question_count}")
+        logger.debug("Question count incremented to %s", fresh_lobby.question_count)
         session.commit()
+        game_manager.invalidate_lobby_data(room)
         
         # Send question count update to all players
         questions_until_vote = max(0, 5 - fresh_lobby.question_count)
-        game_manager.socketio.emit('question_count_update', {
+        count_update = {
             'question_count': fresh_lobby.question_count,
             'questions_until_vote': questions_until_vote,
             'can_vote': fresh_lobby.question_count >= 5
-        }, room=room)
+        }
+        if guess:
+            count_update['location_guess'] = guess
+        game_manager.socketio.emit('question_count_update', count_update, room=room)
         
         # Move to next turn (no automatic voting)
         fresh_lobby.turn += 1
-        logger.info(f"DEBUG: Turn incremented to {fresh_lobby.turn}")
+        logger.debug("Turn incremented to %s", fresh_lobby.turn)
         session.commit()
         game_manager.start_next_turn(room)
         
     except Exception as e:
-        logger.error(f"Error in AI answer turn progression: {e}")
+        logger.error("Error in AI answer turn progression: %s", e)
     finally:
-        session.close()
+        close_db_session(session)
 
-def ai_vote_with_delay(socketio, lobby, players, ai_sid, game_manager=None, delay=1):
+def ai_vote_with_delay(socketio, room, players, ai_sid, game_manager=None, delay=1):
     """AI votes after a delay."""
-    # Get the room name before the lobby object becomes detached
-    room = lobby.room if hasattr(lobby, 'room') else 'main'
-    logger.info(f"DEBUG: AI voting setup for room: {room}")
-    
-    def delayed_vote():
-        socketio.sleep(delay)
-        voted_for = ai_vote_random(players, ai_sid)
-        if voted_for:
-            if voted_for == 'pass':
-                logger.info(f"DEBUG: AI {ai_sid} chose to pass")
-            else:
-                # Find the player name for logging
-                target_player = next((p for p in players if p.sid == voted_for), None)
-                target_name = target_player.username if target_player else voted_for
-                logger.info(f"DEBUG: AI {ai_sid} voting for {target_name} (SID: {voted_for})")
-            
-            if game_manager:
-                logger.info(f"DEBUG: AI calling handle_vote for room: {room}")
-                game_manager.handle_vote(ai_sid, voted_for, room)
-    
-    socketio.start_background_task(delayed_vote)
+    logger.debug("AI voting setup for room: %s", room)
+    # Choose now, while the player objects are still attached; only plain values are scheduled
+    voted_for = ai_vote_random(players, ai_sid, game_manager.game_rng(room) if game_manager else random)
+    if not voted_for or not game_manager:
+        return
+    if voted_for == 'pass':
+        logger.debug("AI %s chose to pass", ai_sid)
+    else:
+        target_name = next((p.username for p in players if p.sid == voted_for), voted_for)
+        logger.debug("AI %s will vote for %s (SID: %s)", ai_sid, target_name, voted_for)
+    run_after(socketio, delay, with_session(game_manager.handle_vote), ai_sid, voted_for, room,
+              is_current=game_manager.current_game_check(room))
 
 def generate_location_guess(question, answer, previous_qa_pairs, location, question_count):
     """Generate an AI location guess based on the conversation."""
     try:
         # Build context from previous Q&A pairs
-        context = ""
-        for qa in previous_qa_pairs:
-            context += f"Q: {qa['question']}\nA: {qa['answer']}\n"
+        context = "".join(f"Q: {qa['question']}\nA: {qa['answer']}\n" for qa in previous_qa_pairs)
         
-        logger.info(f"DEBUG: Location guess - Question count: {question_count}")
-        logger.info(f"DEBUG: Location guess - Context length: {len(context)}")
+        logger.debug("Location guess - Question count: %s", question_count)
+        logger.debug("Location guess - Context length: %s", len(context))
         
         if question_count >= 3:
             # After question 3, force a guess with a very aggressive prompt
-            system_prompt = f"""You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
-            
-            You are the AI outsider who doesn't know the location. You have reached question 3 and MUST make your best educated guess.
-            
-            Available Spyfall locations: {', '.join(LOCATIONS)}
-            
-            Previous conversation:
-            {context}
-            
-            Latest Q&A:
-            Q: {question}
-            A: {answer}
-            
-            Based on ALL the clues from the questions and answers, which Spyfall location do you think the other players know? 
-            You MUST choose from the available locations: {', '.join(LOCATIONS)}
-            Look for clues about: activities, people, objects, atmosphere, sounds, smells, or unique features.
-            Do not say "I don't know" or "not sure" - make your best educated guess based on the conversation.
-            If you see ANY location-related clues, use them to make your guess.
-            
-            IMPORTANT: Return ONLY the location name from the list, nothing else."""
+            system_prompt = FORCED_GUESS_PROMPT.format(context=context, question=question, answer=answer)
 
-            logger.info(f"DEBUG: Sending forced guess prompt to GPT-4o")
+            logger.debug("Sending forced guess prompt to GPT-4o")
             response = get_openai_client().chat.completions.create(
                 model="gpt-4o",
                 messages=[
@@ -432,51 +586,24 @@ def generate_location_guess(question, answer, previous_qa_pairs, location, quest
             )
             
             guess = response.choices[0].message.content.strip()
-            logger.info(f"DEBUG: GPT-4o forced guess response: '{guess}'")
+            logger.debug("GPT-4o forced guess response: '%s'", guess)
             
             # Clean up and extract location
             guess = guess.replace('"', '').replace("'", '').strip()
             
-            # Extract location name from response - look for exact matches first
-            for loc in LOCATIONS:
-                if loc.lower() in guess.lower():
-                    logger.info(f"DEBUG: Found location match: {loc}")
-                    return loc
-            
-            # If no exact match, try to extract any capitalized words that might be locations
-            words = guess.split()
-            for word in words:
-                word_clean = word.replace('"', '').replace("'", '').replace(',', '').replace('.', '').strip()
-                if word_clean[0].isupper() and len(word_clean) > 2 and word_clean.lower() not in ['the', 'and', 'but', 'for', 'with', 'from', 'this', 'that', 'what', 'when', 'where', 'why', 'how', 'no', 'guess', 'not', 'sure', 'confident', 'i', 'don\'t', 'know', 'have', 'enough', 'information', 'could', 'would', 'should', 'might', 'may', 'based', 'clues', 'provided', 'location', 'think', 'other', 'players', 'know']:
-                    # Check if this word matches any location
-                    for loc in LOCATIONS:
-                        if loc.lower() == word_clean.lower():
-                            logger.info(f"DEBUG: Found location match from word extraction: {loc}")
-                            return loc
-            
-            return "Unknown"
+            location_match = match_location(guess)
+            if location_match:
+                logger.debug("Found location match: %s", location_match)
+            return location_match or "Unknown"
         else:
             # For early questions, only guess if we have strong clues
             if len(context) < 50:  # Not enough context yet
-                logger.info(f"DEBUG: Not enough context for location guess (length: {len(context)})")
+                logger.debug("Not enough context for location guess (length: %s)", len(context))
                 return None
             
-            system_prompt = f"""You are playing Spyfall, a social deduction game where players know a specific location except for one outsider (you).
-            
-            You are the AI outsider who doesn't know the location. Based on the conversation so far, can you guess which Spyfall location the other players know?
-            
-            Available Spyfall locations: {', '.join(LOCATIONS)}
-            
-            Previous conversation:
-            {context}
-            
-            Latest Q&A:
-            Q: {question}
-            A: {answer}
-            
-            Based on all this information, can you guess which Spyfall location the other players know? If you see ANY clues, what is your best guess from the available options? If absolutely no clues, say "NO_GUESS"."""
+            system_prompt = REGULAR_GUESS_PROMPT.format(context=context, question=question, answer=answer)
 
-            logger.info(f"DEBUG: Sending regular guess prompt to GPT-4o")
+            logger.debug("Sending regular guess prompt to GPT-4o")
             response = get_openai_client().chat.completions.create(
                 model="gpt-4o",
                 messages=[
@@ -489,41 +616,29 @@ def generate_location_guess(question, answer, previous_qa_pairs, location, quest
             )
             
             guess = response.choices[0].message.content.strip()
-            logger.info(f"DEBUG: GPT-4o regular guess response: '{guess}'")
+            logger.debug("GPT-4o regular guess response: '%s'", guess)
             
             # Clean up the response
             if "NO_GUESS" in guess.upper() or "NOT CONFIDENT" in guess.upper() or "NOT SURE" in guess.upper():
-                logger.info(f"DEBUG: AI returned NO_GUESS - not confident enough")
+                logger.debug("AI returned NO_GUESS - not confident enough")
                 return None
             
             # Extract location name (remove quotes, extra text, etc.)
             guess = guess.replace('"', '').replace("'", '').strip()
-            if guess.lower() in ['no guess', 'not sure', 'i don\'t know', 'i don\'t have enough information']:
-                logger.info(f"DEBUG: AI returned no guess after cleanup")
+            if guess.lower() in NO_GUESS_REPLIES:
+                logger.debug("AI returned no guess after cleanup")
                 return None
             
-            # Extract location name from response - look for exact matches first
-            for loc in LOCATIONS:
-                if loc.lower() in guess.lower():
-                    logger.info(f"DEBUG: Found location match: {loc}")
-                    return loc
+            location_match = match_location(guess)
+            if location_match:
+                logger.debug("Found location match: %s", location_match)
+                return location_match
             
-            # If no exact match, try to extract any capitalized words that might be locations
-            words = guess.split()
-            for word in words:
-                word_clean = word.replace('"', '').replace("'", '').replace(',', '').replace('.', '').strip()
-                if word_clean[0].isupper() and len(word_clean) > 2 and word_clean.lower() not in ['the', 'and', 'but', 'for', 'with', 'from', 'this', 'that', 'what', 'when', 'where', 'why', 'how', 'no', 'guess', 'not', 'sure', 'confident', 'i', 'don\'t', 'know', 'have', 'enough', 'information', 'could', 'would', 'should', 'might', 'may', 'based', 'clues', 'provided', 'location', 'think', 'other', 'players', 'know']:
-                    # Check if this word matches any location
-                    for loc in LOCATIONS:
-                        if loc.lower() == word_clean.lower():
-                            logger.info(f"DEBUG: Found location match from word extraction: {loc}")
-                            return loc
-                
-            logger.info(f"DEBUG: AI returning guess: {guess}")
+            logger.debug("AI returning guess: %s", guess)
             return guess
         
     except Exception as e:
-        logger.error(f"Error generating location guess: {e}")
+        logger.error("Error generating location guess: %s", e)
         if question_count >= 3:
             return "Unknown"  # Force a guess after Q3 even on error
         return None 
\ No newline at end of file
@@ -1,225 +1,541 @@
+import itertools
+import os
 import random
+from collections import Counter, deque
 import threading
 import time
 import logging
 from models.database import (
-    SessionLocal, get_lobby, get_players, get_player_by_sid, 
-    add_message, clear_votes, get_vote_count, get_messages,
+    get_lobby, get_player_by_sid, 
+    add_message, clear_votes, get_votes_by_voter, get_messages,
     get_win_counter, increment_human_wins, increment_ai_wins,
-    get_db_session, close_db_session, Message, Player, Lobby
+    get_db_session, close_db_session, reset_lobby, get_lobby_rows
 )
 from utils.constants import LOCATIONS
+from utils.lru import LRUDict
+from utils.tasks import run_after
+from cache.client import redis_client
+from config.settings import REDIS_URL
 from game.ai import ai_ask_question_with_delay, ai_answer_with_delay, ai_vote_with_delay
 
 logger = logging.getLogger(__name__)
 
+# Seconds a cached lobby snapshot lives in Redis before it is rebuilt
+LOBBY_DATA_TTL = 30
+
+# Seconds to wait for more joins/leaves before broadcasting the player list
+LOBBY_BROADCAST_DELAY = 0.05
+
+# Caps on the in-memory caches below; evicted entries are rebuilt from the database on demand
+MAX_CACHED_ROOMS = 1000
+MAX_INDEXED_PLAYERS = 10000
+
+# Inactivity handling: warn after 4 minutes idle, reset after 5, checked every 10 seconds
+INACTIVITY_WARNING_AFTER = 240
+INACTIVITY_RESET_AFTER = 300
+INACTIVITY_CHECK_INTERVAL = 10
+
+# Q&A pairs kept per room for the AI's location guess, and how long Redis keeps them
+QA_HISTORY_SIZE = 20
+QA_HISTORY_TTL = 3600
+
+def lobby_data_key(room):
+    """Redis key for a lobby's cached snapshot."""
+    return f"lobby:{room}"
+
+def qa_history_key(room):
+    """Redis key for a room's recent Q&A pairs; the pending question lives under the same prefix."""
+    return f"qa:{room}"
+
+def players_room(room):
+    """Name of the room holding only the active (non-spectator) players of a lobby."""
+    return f"{room}:players"
+
+def rooms_for_player(room, is_spectator=False):
+    """Return every room a client should be in for the given lobby."""
+    if is_spectator:
+        return [room]
+    return [room, players_room(room)]
+
 class GameManager:
     def __init__(self, socketio):
         self.socketio = socketio
-        self.last_activity = time.time()
-        self.inactivity_timer = None
-        self.warning_timer = None
+        self._last_activity = LRUDict(MAX_CACHED_ROOMS)  # room -> time of the last action while its game runs
+        self._inactivity_paused = set()  # rooms whose AI is busy, so the quiet doesn't count
+        self._inactivity_warned = set()  # rooms already warned about the coming reset
+        self._inactivity_monitor_started = False
         self.is_resetting = False  # Add flag to track reset state
+        self._pending_lobby_logs = {}  # room -> log lines waiting for the next lobby broadcast
+        self._pending_lobby_joins = set()  # rooms whose next lobby broadcast must carry the full player list
+        self._lobby_broadcast_lock = threading.Lock()
+        self._last_sent_players = LRUDict(MAX_CACHED_ROOMS)  # room -> player list in the last lobby broadcast
+        self._sid_to_lobby = LRUDict(MAX_INDEXED_PLAYERS)  # sid -> room, for every socket that joined as a player
+        self._players_by_sid = LRUDict(MAX_INDEXED_PLAYERS)  # sid -> (room, player id, username, is_ai), humans and AI
+        self._sids_by_username = LRUDict(MAX_INDEXED_PLAYERS)  # (room, username) -> sid
+        # Generations and versions come from one counter, so a room evicted and seen again never
+        # gets back a value an older task or rebuild is still holding
+        self._stamps = itertools.count(1)
+        self._game_generations = LRUDict(MAX_CACHED_ROOMS)  # room -> changed on every reset so delayed AI work from an old game is dropped
+        self._turn_orders = LRUDict(MAX_CACHED_ROOMS)  # room -> [(sid, player id, is_ai, username)] in asking order
+        self._lobby_snapshots = LRUDict(MAX_CACHED_ROOMS)  # room -> lobby data, used when there is no shared Redis cache
+        self._lobby_versions = LRUDict(MAX_CACHED_ROOMS)  # room -> changed on every invalidation so stale rebuilds aren't stored
+        self._win_counts = LRUDict(MAX_CACHED_ROOMS)  # room -> {'human_wins', 'ai_wins'}, kept in step with the win_counters table (single worker only)
+        self._pending_questions = LRUDict(MAX_CACHED_ROOMS)  # room -> question waiting for its answer
+        self._qa_history = LRUDict(MAX_CACHED_ROOMS)  # room -> deque of the latest {'question', 'answer'} pairs
+        self._rngs = LRUDict(MAX_CACHED_ROOMS)  # room -> Random seeded at game start, so a game can be replayed from its seed
         # Don't start inactivity timer on init - only during active games
     
     def start_game(self, room="main"):
         """Start a new game."""
         logger.info("=== GAME MANAGER START_GAME CALLED ===")
-        logger.info(f"Starting game for room: {room}")
+        logger.info("Starting game for room: %s", room)
         session = None
         try:
             logger.info("Creating database session...")
             session = get_db_session()
             logger.info("Getting lobby...")
-            lobby = get_lobby(session, room)
-            logger.info(f"Got lobby: {lobby.room}, state: {lobby.state}")
+            lobby = get_lobby(session, room, with_players=True)
+            logger.info("Got lobby: %s, state: %s", lobby.room, lobby.state)
             logger.info("Getting players...")
-            players = get_players(session, lobby)
-            logger.info(f"Found {len(players)} players: {[p.username for p in players]}")
+            players = lobby.players
+            logger.info("Found %s players: %s", len(players), [p.username for p in players])
             
             if len(players) < 2:
-                logger.warning(f"Not enough players to start game: {len(players)}")
+                logger.warning("Not enough players to start game: %s", len(players))
                 return False, "Need at least 2 players to start"
             
             logger.info("Setting up game state...")
+            seed = int.from_bytes(os.urandom(8), 'big')
+            rng = self._rngs[room] = random.Random(seed)
+            logger.info("Game seed for %s: %s", room, seed)
             # Reset game state
             lobby.state = 'playing'
-            lobby.location = random.choice(LOCATIONS)
+            lobby.location = rng.choice(LOCATIONS)
             lobby.turn = 0
             lobby.question_count = 0
             lobby.current_question_asker = None
             lobby.current_target = None
             
             # Set player order (random)
+            for p in players:
+                self.index_player(room, p)
             player_sids = [p.sid for p in players]
-            random.shuffle(player_sids)
+            rng.shuffle(player_sids)
             lobby.player_order = ','.join(player_sids)
-            logger.info(f"Player order: {player_sids}")
-            logger.info(f"First asker will be: {player_sids[0]}")
+            by_sid = {p.sid: p for p in players}
+            self._turn_orders[room] = [
+                (sid, by_sid[sid].id, by_sid[sid].is_ai, by_sid[sid].username) for sid in player_sids
+            ]
+            logger.info("Player order: %s", player_sids)
+            logger.info("First asker will be: %s", player_sids[0])
             
             # Always assign AI as outsider
             ai_players = [p for p in players if p.is_ai]
             if ai_players:
                 lobby.outsider_sid = ai_players[0].sid  # Just use the first AI player
-                logger.info(f"AI outsider assigned: {ai_players[0].username}")
+                logger.info("AI outsider assigned: %s", ai_players[0].username)
             
             logger.info("Committing database changes...")
             session.commit()
+            self.invalidate_lobby_data(room)
             logger.info("Database changes committed successfully")
             
-            # Send game state to all players
-            player_data = [{'sid': p.sid, 'username': p.username, 'is_ai': p.is_ai} for p in players]
-            logger.info(f"DEBUG: Sending game_started event with location: {lobby.location}")
-            logger.info(f"DEBUG: Emitting to room: {room}")
-            logger.info(f"DEBUG: Players in room: {[p.username for p in players]}")
-            
-            # Get all clients in the room for debugging
-            from flask_socketio import rooms
-            room_clients = rooms(room)
-            logger.info(f"DEBUG: Clients in room {room}: {room_clients}")
-            
-            # Debug: Check if any clients are in the room at all
-            all_rooms = rooms()
-            logger.info(f"DEBUG: All rooms: {all_rooms}")
-            
-            # Try sending to individual clients as fallback
-            if not room_clients:
-                logger.info(f"DEBUG: Room is empty, sending to individual clients")
-                for player in players:
-                    if not player.is_ai:
-                        logger.info(f"DEBUG: Sending game_started to {player.username} (SID: {player.sid})")
-                        self.socketio.emit('game_started', {
-                            'location': lobby.location,
-                            'players': player_data,
-                            'player_order': player_sids
-                        }, room=player.sid)
-            
-            # Also try sending to room (in case the rooms() function is wrong)
+            # Send game state to all players. The client's player list takes plain names,
+            # so the list is built and sent once here rather than again in game_update.
+            player_names = [p.username for p in players]
+            logger.debug("Sending game_started event with location: %s", lobby.location)
+            logger.debug("Emitting to room: %s", room)
+            logger.debug("Players in room: %s", player_names)
+            
+            # One payload, one room emit: the manager encodes it once for every client.
+            # (rooms(room) looks up the rooms *of* a sid named room, so it was always
+            # empty and every player used to get game_started twice.)
             self.socketio.emit('game_started', {
                 'location': lobby.location,
-                'players': player_data,
-                'player_order': player_sids
+                'players': player_names,
+                'player_order': player_sids,
+                'seed': seed
             }, room=room)
-            logger.info(f"DEBUG: game_started event emitted successfully")
+            self._last_sent_players[room] = player_names
+            logger.debug("game_started event emitted successfully")
             
-            # Send game_update to populate target dropdown
-            player_names = [p.username for p in players]
-            logger.info(f"DEBUG: Sending game_update with players: {player_names}")
+            # game_started already filled in the player list and target dropdown
             self.socketio.emit('game_update', {
-                'players': player_names,
                 'log': 'Game started!',
                 'can_start_game': False
             }, room=room)
             
-            logger.info(f"DEBUG: Starting first turn...")
+            logger.debug("Starting first turn...")
             # Start first turn
             self.start_next_turn(room)
             
             # Start inactivity timer only when game starts
-            self.update_activity()
+            self.update_activity(room, lobby.state)
             logger.info("=== GAME STARTED SUCCESSFULLY ===")
             return True, "Game started successfully"
             
         except Exception as e:
-            logger.error(f"Error starting game: {e}")
+            logger.error("Error starting game: %s", e)
             import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.error("Traceback: %s", traceback.format_exc())
             return False, "Error starting game"
         finally:
             if session:
                 logger.info("Closing database session...")
                 close_db_session(session)
     
+    def game_rng(self, room="main"):
+        """The room's Random while a game runs; the module's shared one before the first game."""
+        return self._rngs.get(room, random)
+    
+    def get_game_generation(self, room="main"):
+        """Marker for the room's current game in this process; it changes on every reset."""
+        return self._game_generations.get(room, 0)
+    
+    def current_game_check(self, room="main"):
+        """Return a callable that is True while the room hasn't been reset since this call."""
+        generation = self.get_game_generation(room)
+        return lambda: self._game_generations.get(room, 0) == generation
+    
+    def get_win_counts(self, room="main"):
+        """Return a room's win counts, reading the database only on first use.
+
+        With several workers a game can end on any of them, so the table is read every time.
+        """
+        counts = self._win_counts.get(room) if not REDIS_URL else None
+        if counts is None:
+            session = get_db_session()
+            try:
+                counts = self._remember_win_counts(room, get_win_counter(session, room))
+            finally:
+                close_db_session(session)
+        return counts
+    
+    def _remember_win_counts(self, room, counter):
+        """Cache the counts from a freshly read or updated WinCounter row."""
+        counts = {'human_wins': counter.human_wins, 'ai_wins': counter.ai_wins}
+        if not REDIS_URL:
+            self._win_counts[room] = counts
+        return counts
+    
+    def record_question(self, room, question):
+        """Hold a question until its answer arrives."""
+        if REDIS_URL:
+            # The answer may arrive on another worker. Stored as JSON so a question that
+            # happens to start with '[' or '{' isn't mistaken for an encoded value.
+            redis_client.set(f"{qa_history_key(room)}:pending", {'question': question}, ttl=QA_HISTORY_TTL)
+            return
+        self._pending_questions[room] = question
+    
+    def record_answer(self, room, answer, question=None):
+        """Add a Q&A pair to the room's history; question defaults to the last one recorded."""
+        if REDIS_URL:
+            key = qa_history_key(room)
+            if question is None:
+                pending = redis_client.get(f"{key}:pending")
+                question = pending.get('question') if isinstance(pending, dict) else None
+            # Drop the pending question and append the pair in one round trip
+            with redis_client.pipeline() as pipe:
+                redis_client.delete(f"{key}:pending", pipe=pipe)
+                if question is not None:
+                    redis_client.push_capped(key, {'question': question, 'answer': answer}, QA_HISTORY_SIZE,
+                                             ttl=QA_HISTORY_TTL, pipe=pipe)
+            return
+        pending = self._pending_questions.pop(room, None)
+        question = question or pending
+        if question is None:
+            return
+        history = self._qa_history.get(room)
+        if history is None:
+            history = self._qa_history[room] = deque(maxlen=QA_HISTORY_SIZE)
+        history.append({'question': question, 'answer': answer})
+    
+    def clear_pending_question(self, room):
+        """Drop a question that will never get its answer."""
+        if REDIS_URL:
+            redis_client.delete(f"{qa_history_key(room)}:pending")
+            return
+        self._pending_questions.pop(room, None)
+    
+    def get_qa_history(self, room):
+        """Recent Q&A pairs, oldest first, or None if Redis is set but unreachable."""
+        if REDIS_URL:
+            return redis_client.get_list(qa_history_key(room))
+        return list(self._qa_history.get(room, ()))
+    
+    def register_player(self, sid, room="main"):
+        """Remember which lobby a player's socket belongs to."""
+        self._sid_to_lobby[sid] = room
+    
+    def unregister_player(self, sid):
+        """Forget a socket's lobby and return it, or None if it never joined as a player."""
+        self._unindex_player(sid)
+        return self._sid_to_lobby.pop(sid, None)
+    
+    def handle_player_left(self, room, sid):
+        """Take a departed player out of the turn order, and move the turn on if it was theirs.
+
+        Call after the player's row is deleted. The asker who was up stays up
+        unless they are the one who left; then the next player in order asks.
+        """
+        session = get_db_session()
+        try:
+            lobby = get_lobby(session, room, fresh=True)
+            order = lobby.player_order.split(',') if lobby.player_order else []
+            if sid in order:
+                index = order.index(sid)
+                current = lobby.turn % len(order)
+                order.remove(sid)
+                lobby.player_order = ','.join(order)
+                if order:
+                    # Keep lobby.turn pointing at the same asker now that the order is shorter
+                    current = current - 1 if index < current else current % len(order)
+                    lobby.turn -= (lobby.turn - current) % len(order)
+            if room in self._turn_orders:
+                # A departed player can't ask or be asked
+                self._turn_orders[room] = [entry for entry in self._turn_orders[room] if entry[0] != sid]
+            
+            turn_was_theirs = lobby.state == 'playing' and sid in (lobby.current_question_asker, lobby.current_target)
+            if turn_was_theirs:
+                # Nobody is left to ask or answer the open question
+                lobby.current_question_asker = None
+                lobby.current_target = None
+                self.clear_pending_question(room)
+            session.commit()
+            if turn_was_theirs:
+                logger.info("Player %s left during their turn in %s; starting the next turn", sid, room)
+                self.start_next_turn(room)
+        except Exception as e:
+            logger.error("Error handling player leaving: %s", e)
+        finally:
+            close_db_session(session)
+    
+    def index_player(self, room, player):
+        """Record a player's row id, username and AI flag so hot paths can skip lookup queries."""
+        self._unindex_player(player.sid)
+        self._players_by_sid[player.sid] = (room, player.id, player.username, player.is_ai)
+        self._sids_by_username[(room, player.username)] = player.sid
+    
+    def _unindex_player(self, sid):
+        entry = self._players_by_sid.pop(sid, None)
+        if entry:
+            self._sids_by_username.pop((entry[0], entry[2]), None)
+    
+    def get_player_info(self, session, lobby, sid):
+        """Return (username, is_ai) for a player in the lobby, or None; reads the index before the database."""
+        entry = self._players_by_sid.get(sid)
+        if entry and entry[0] == lobby.room:
+            return entry[2], entry[3]
+        player = get_player_by_sid(session, lobby, sid)
+        if player is None:
+            return None
+        self.index_player(lobby.room, player)
+        return player.username, player.is_ai
+    
+    def get_player_id(self, sid):
+        """Return the indexed database id of a player's row, or None."""
+        entry = self._players_by_sid.get(sid)
+        return entry[1] if entry else None
+    
+    def find_sid_by_username(self, room, username):
+        """Return the sid of the player with this username in a room, or None if not indexed."""
+        return self._sids_by_username.get((room, username))
+    
+    def get_player_lobby(self, sid):
+        """Return the room a socket joined as a player, or None."""
+        return self._sid_to_lobby.get(sid)
+    
+    def get_lobby_data(self, room="main"):
+        """Return a snapshot of the lobby state and players, served from cache when possible."""
+        # A single process owns all game state, so its own copy is always current;
+        # with several workers only the shared Redis copy can be trusted.
+        data = self._lobby_snapshots.get(room) if not REDIS_URL else redis_client.get(lobby_data_key(room))
+        if data is not None:
+            return data
+        
+        version = self._lobby_versions.get(room, 0)
+        session = get_db_session()
+        try:
+            rows = get_lobby_rows(session, room)
+            if not rows:
+                lobby = get_lobby(session, room)  # creates the lobby on first use
+                rows = [(lobby.room, lobby.state, lobby.question_count, None, None, None)]
+            lobby_room, state, question_count = rows[0][:3]
+            data = {
+                'room': lobby_room,
+                'state': state,
+                'question_count': question_count,
+                'players': [{'sid': sid, 'username': username, 'is_ai': is_ai}
+                            for _, _, _, sid, username, is_ai in rows if sid is not None]
+            }
+        finally:
+            close_db_session(session)
+        
+        if REDIS_URL:
+            redis_client.set(lobby_data_key(room), data, ttl=LOBBY_DATA_TTL)
+        elif self._lobby_versions.get(room, 0) == version:
+            # Skip storing if the lobby changed while this snapshot was being loaded
+            self._lobby_snapshots[room] = data
+        return data
+    
+    def invalidate_lobby_data(self, room="main"):
+        """Drop the cached lobby snapshot after the lobby or its players change."""
+        self._lobby_versions[room] = next(self._stamps)
+        self._lobby_snapshots.pop(room, None)
+        if REDIS_URL:
+            redis_client.delete(lobby_data_key(room))
+    
+    def schedule_lobby_broadcast(self, room="main", log=None, joined=False):
+        """Queue a player-list broadcast, coalescing a burst of joins/leaves into one game_update.
+
+        Pass joined=True for a new socket: it has no player list yet, so the broadcast carries one.
+        """
+        with self._lobby_broadcast_lock:
+            pending = self._pending_lobby_logs.get(room)
+            if pending is None:
+                pending = self._pending_lobby_logs[room] = []
+                self.socketio.start_background_task(self._flush_lobby_broadcast, room)
+            if log:
+                pending.append(log)
+            if joined:
+                self._pending_lobby_joins.add(room)
+    
+    def room_has_listeners(self, room):
+        """Whether any client is connected to a room.
+
+        With a message queue other workers may hold members this process can't
+        see, so the answer is always yes.
+        """
+        if REDIS_URL:
+            return True
+        return bool(self.socketio.server.manager.rooms.get('/', {}).get(room))
+    
+    def _flush_lobby_broadcast(self, room):
+        """Send one game_update with the latest player list and every queued log line."""
+        self.socketio.sleep(LOBBY_BROADCAST_DELAY)
+        with self._lobby_broadcast_lock:
+            logs = self._pending_lobby_logs.pop(room, [])
+            joined = room in self._pending_lobby_joins
+            self._pending_lobby_joins.discard(room)
+        if not self.room_has_listeners(room):
+            # Last client left; whoever joins next needs the full player list
+            self._last_sent_players.pop(room, None)
+            return
+        try:
+            lobby_data = self.get_lobby_data(room)
+            player_names = [p['username'] for p in lobby_data['players']]
+            update = {}
+            # Only resend the player list when it differs from what clients already have.
+            # That is only known for a single process that saw every change, and a
+            # socket that just joined has no list at all.
+            if REDIS_URL or joined or player_names != self._last_sent_players.get(room):
+                update['players'] = player_names
+                self._last_sent_players[room] = player_names
+            if lobby_data['state'] == 'waiting':
+                update['can_start_game'] = len(player_names) >= 2
+            if logs:
+                update['log'] = '<br>'.join(logs)
+            if update:
+                self.socketio.emit('game_update', update, room=room)
+        except Exception as e:
+            logger.error("Error broadcasting lobby update: %s", e)
+    
     def start_next_turn(self, room="main"):
         """Start the next turn in the game."""
         session = None
         try:
             session = get_db_session()
-            lobby = get_lobby(session, room)
-            players = get_players(session, lobby)
+            # Current row, not a copy the shared session loaded before a slow AI call
+            lobby = get_lobby(session, room, fresh=True)
             
             if lobby.state != 'playing':
                 return
             
-            player_sids = lobby.player_order.split(',') if lobby.player_order else []
-            if not player_sids:
+            turn_order = self._get_turn_order(session, lobby, room)
+            if not turn_order:
                 return
             
             # Get next question asker
-            current_turn = lobby.turn % len(player_sids)
-            logger.info(f"DEBUG: lobby.turn = {lobby.turn}, len(player_sids) = {len(player_sids)}, current_turn = {current_turn}")
-            asker_sid = player_sids[current_turn]
-            logger.info(f"Turn {lobby.turn}: asker_sid = {asker_sid}")
+            current_turn = lobby.turn % len(turn_order)
+            logger.debug("lobby.turn = %s, len(turn_order) = %s, current_turn = %s", lobby.turn, len(turn_order), current_turn)
+            asker_sid, _, asker_is_ai, asker_name = turn_order[current_turn]
+            logger.info("Turn %s: asker_sid = %s", lobby.turn, asker_sid)
             
             # Get random target (excluding asker)
-            possible_targets = [sid for sid in player_sids if sid != asker_sid]
+            possible_targets = [entry for entry in turn_order if entry[0] != asker_sid]
             if not possible_targets:
                 return
             
-            target_sid = random.choice(possible_targets)
-            logger.info(f"Turn {lobby.turn}: target_sid = {target_sid}")
+            target_sid, _, _, target_name = self.game_rng(room).choice(possible_targets)
+            logger.info("Turn %s: target_sid = %s", lobby.turn, target_sid)
             
             # Update lobby state
             lobby.current_question_asker = asker_sid
             lobby.current_target = target_sid
             session.commit()
             
-            # Get player info
-            asker = get_player_by_sid(session, lobby, asker_sid)
-            target = get_player_by_sid(session, lobby, target_sid)
-            
-            if not asker or not target:
-                logger.error(f"Error: Could not find asker or target player")
-                return
-            
-            logger.info(f"Turn {lobby.turn}: {asker.username} (SID: {asker_sid}) will ask {target.username} (SID: {target_sid})")
+            logger.info("Turn %s: %s (SID: %s) will ask %s (SID: %s)", lobby.turn, asker_name, asker_sid, target_name, target_sid)
             
             # Send turn update to the asker
             turn_data = {
-                'current_asker': asker.username,
+                'current_asker': asker_name,
                 'current_target': None,  # Will be set when question is asked
                 'is_my_turn_to_ask': True,
                 'is_my_turn_to_answer': False,
                 'can_ask': True,
                 'can_answer': False,
                 'turn': lobby.turn + 1,
-                'total_players': len(players)
+                'total_players': len(turn_order)
             }
             
-            print(f"DEBUG: Sending turn_update to {asker.username} (SID: {asker_sid})")
-            print(f"DEBUG: Turn data: {turn_data}")
+            logger.debug("Sending turn_update to %s (SID: %s)", asker_name, asker_sid)
+            logger.debug("Turn data: %s", turn_data)
             
             self.socketio.emit('turn_update', turn_data, room=asker_sid)
-            print(f"DEBUG: Turn update sent to {asker.username}")
+            logger.debug("Turn update sent to %s", asker_name)
             
             # Send spectator turn update to room (spectators will handle this event)
             spectator_turn_data = {
-                'current_asker': asker.username,
+                'current_asker': asker_name,
                 'current_target': None,  # Don't show target until question is asked
                 'turn': lobby.turn + 1,
-                'total_players': len(players)
+                'total_players': len(turn_order)
             }
-            logger.info(f"Sending spectator_turn_update to room: {room}")
+            logger.info("Sending spectator_turn_update to room: %s", room)
             self.socketio.emit('spectator_turn_update', spectator_turn_data, room=room)
             
             # If asker is AI, have AI ask question
-            if asker.is_ai:
-                logger.info(f"AI {asker.username} is the asker, calling ai_ask_question_with_delay")
-                ai_ask_question_with_delay(self.socketio, lobby, asker_sid, target_sid, lobby.location, self, delay=4)
+            if asker_is_ai:
+                logger.info("AI %s is the asker, calling ai_ask_question_with_delay", asker_name)
+                ai_ask_question_with_delay(self.socketio, room, asker_sid, target_sid, lobby.location, self, delay=4,
+                                           target_name=target_name)
             else:
-                logger.info(f"Human {asker.username} is the asker, waiting for manual question")
+                logger.info("Human %s is the asker, waiting for manual question", asker_name)
             
-            self.update_activity()
+            self.update_activity(room, lobby.state)
             
         except Exception as e:
-            logger.error(f"Error starting next turn: {e}")
+            logger.error("Error starting next turn: %s", e)
         finally:
             if session:
                 close_db_session(session)
     
+    def _get_turn_order(self, session, lobby, room):
+        """Return the (sid, player id, is_ai, username) asking order, rebuilding it from the lobby if needed."""
+        turn_order = self._turn_orders.get(room)
+        if turn_order is None:
+            # Game started on another worker or before a restart: rebuild from the stored order
+            player_sids = lobby.player_order.split(',') if lobby.player_order else []
+            by_sid = {p.sid: p for p in lobby.players}  # reuses the collection if already loaded
+            turn_order = [
+                (sid, by_sid[sid].id, by_sid[sid].is_ai, by_sid[sid].username) for sid in player_sids if sid in by_sid
+            ]
+            self._turn_orders[room] = turn_order
+        return turn_order
+    
     def handle_question(self, asker_sid, target_sid, question, room="main"):
         """Handle a question being asked."""
-        session = SessionLocal()
+        session = get_db_session()
         try:
             lobby = get_lobby(session, room)
             
@@ -229,90 +545,96 @@ class GameManager:
             if lobby.current_question_asker != asker_sid or lobby.current_target != target_sid:
                 return
             
-            # Add question to chat
-            asker = get_player_by_sid(session, lobby, asker_sid)
-            target = get_player_by_sid(session, lobby, target_sid)
+            # Names and AI flags only change between games, so they come from the player index
+            asker = self.get_player_info(session, lobby, asker_sid)
+            target = self.get_player_info(session, lobby, target_sid)
             
             if asker and target:
-                message = f"{asker.username} asks {target.username}: {question}"
+                asker_name, _ = asker
+                target_name, target_is_ai = target
+                message = f"{asker_name} asks {target_name}: {question}"
                 add_message(session, lobby, message)
-                logger.info(f"DEBUG: Added question message to database: {message}")
+                self.record_question(room, question)
+                logger.debug("Added question message to database: %s", message)
                 
-                # Send question to all players
+                # Send question to everyone else; the asker already has the text
                 self.socketio.emit('question_asked', {
-                    'asker': asker.username,
-                    'target': target.username,
+                    'asker': asker_name,
+                    'target': target_name,
                     'question': question,
                     'asker_sid': asker_sid,
                     'target_sid': target_sid
-                }, room=room)
+                }, room=room, skip_sid=asker_sid)
+                self.socketio.emit('question_accepted', {}, room=asker_sid)
                 
-                # Send updated turn info with target now visible
-                players = get_players(session, lobby)
-                for player in players:
-                    if not player.is_ai:
-                        # After a question is asked, the asker can no longer ask (they've used their turn)
-                        # Only the target can answer
-                        is_asking = False  # No one can ask after a question is asked
-                        is_answering = (player.sid == target_sid)
-                        turn_data = {
-                            'current_asker': asker.username,
-                            'current_target': target.username,  # Now show the target
-                            'is_my_turn_to_ask': is_asking,
-                            'is_my_turn_to_answer': is_answering,
-                            'can_ask': is_asking,
-                            'can_answer': is_answering,
-                            'turn': lobby.turn + 1,
-                            'total_players': len(players)
-                        }
-                        self.socketio.emit('turn_update', turn_data, room=player.sid)
+                # Send updated turn info with target now visible. After a question is asked
+                # no one can ask and only the target can answer, so there are just two
+                # variants: one for the target and one for every other player.
+                turn_data = {
+                    'current_asker': asker_name,
+                    'current_target': target_name,  # Now show the target
+                    'is_my_turn_to_ask': False,
+                    'is_my_turn_to_answer': False,
+                    'can_ask': False,
+                    'can_answer': False,
+                    'turn': lobby.turn + 1,
+                    'total_players': len(self._get_turn_order(session, lobby, room))
+                }
+                self.socketio.emit('turn_update', turn_data, room=players_room(room), skip_sid=target_sid)
+                if not target_is_ai:
+                    self.socketio.emit('turn_update', dict(turn_data, is_my_turn_to_answer=True, can_answer=True),
+                                       room=target_sid)
                 
                 # If target is AI, have AI answer
-                if target.is_ai:
-                    logger.info(f"DEBUG: Target {target.username} is AI, calling ai_answer_with_delay")
-                    ai_answer_with_delay(self.socketio, lobby, target_sid, question, lobby.location, self)
+                if target_is_ai:
+                    logger.debug("Target %s is AI, calling ai_answer_with_delay", target_name)
+                    ai_answer_with_delay(self.socketio, room, target_sid, question, lobby.location, self)
                 else:
-                    logger.info(f"DEBUG: Target {target.username} is human, waiting for manual answer")
+                    logger.debug("Target %s is human, waiting for manual answer", target_name)
             
-            self.update_activity()
+            self.update_activity(room, lobby.state)
             
         except Exception as e:
-            logger.error(f"Error handling question: {e}")
+            logger.error("Error handling question: %s", e)
         finally:
-            session.close()
+            close_db_session(session)
     
     def handle_answer(self, target_sid, answer, room="main"):
         """Handle an answer to a question."""
-        session = SessionLocal()
+        session = get_db_session()
         try:
             lobby = get_lobby(session, room)
             
             if lobby.state != 'playing':
-                logger.info(f"DEBUG: handle_answer called but game state is {lobby.state}, not playing")
+                logger.debug("handle_answer called but game state is %s, not playing", lobby.state)
                 return
             
             if lobby.current_target != target_sid:
-                logger.info(f"DEBUG: handle_answer called for target_sid {target_sid} but current_target is {lobby.current_target}")
+                logger.debug("handle_answer called for target_sid %s but current_target is %s", target_sid, lobby.current_target)
                 return
             
-            target = get_player_by_sid(session, lobby, target_sid)
+            target = self.get_player_info(session, lobby, target_sid)
             if target:
-                logger.info(f"DEBUG: Processing answer from {target.username}: {answer}")
-                message = f"{target.username} answers: {answer}"
-                add_message(session, lobby, message)
+                target_name, target_is_ai = target
+                logger.debug("Processing answer from %s: %s", target_name, answer)
+                message = f"{target_name} answers: {answer}"
+                add_message(session, lobby, message, commit=False)  # committed with the question count
+                self.record_answer(room, answer)
                 
                 # Only emit answer_given for human players (AI players emit ai_answer)
-                if not target.is_ai:
+                if not target_is_ai:
                     self.socketio.emit('answer_given', {
-                        'target': target.username,
+                        'target': target_name,
                         'answer': answer,
                         'target_sid': target_sid
-                    }, room=room)
+                    }, room=room, skip_sid=target_sid)
+                    self.socketio.emit('answer_accepted', {}, room=target_sid)
                 
                 # Increment question count and check for voting
                 lobby.question_count += 1
-                logger.info(f"DEBUG: Question count incremented to {lobby.question_count}")
+                logger.debug("Question count incremented to %s", lobby.question_count)
                 session.commit()
+                self.invalidate_lobby_data(room)
                 
                 # Send question count update to all players
                 questions_until_vote = max(0, 5 - lobby.question_count)
@@ -324,43 +646,42 @@ class GameManager:
                 
                 # Move to next turn (no automatic voting)
                 lobby.turn += 1
-                logger.info(f"DEBUG: Turn incremented to {lobby.turn}")
+                logger.debug("Turn incremented to %s", lobby.turn)
                 session.commit()
                 self.start_next_turn(room)
             else:
-                logger.info(f"DEBUG: handle_answer called but target player not found for sid {target_sid}")
+                logger.debug("handle_answer called but target player not found for sid %s", target_sid)
             
-            self.update_activity()
+            self.update_activity(room, lobby.state)
             
         except Exception as e:
-            logger.error(f"Error handling answer: {e}")
+            logger.error("Error handling answer: %s", e)
         finally:
-            session.close()
+            close_db_session(session)
     
     def start_voting(self, room="main"):
         """Start the voting phase."""
-        session = SessionLocal()
+        session = get_db_session()
         try:
-            lobby = get_lobby(session, room)
-            players = get_players(session, lobby)
+            lobby = get_lobby(session, room, with_players=True)
+            players = lobby.players
             
             if lobby.state != 'playing':
                 return
             
+            logger.debug("Starting voting with %s players", len(players))
+            
+            # Switch state, clear previous votes and post the chat message in one commit
             lobby.state = 'voting'
+            clear_votes(session, lobby, commit=False)
+            add_message(session, lobby, "🗳️ Voting has begun! Each player must vote for someone or choose to pass.",
+                        commit=False)
             session.commit()
-            
-            logger.info(f"DEBUG: Starting voting with {len(players)} players")
-            
-            # Clear previous votes
-            clear_votes(session, lobby)
-            
-            # Add voting start message to chat
-            add_message(session, lobby, "🗳️ Voting has begun! Each player must vote for someone or choose to pass.")
+            self.invalidate_lobby_data(room)
             
             # Send voting start event to all players
             voting_players = [{'sid': p.sid, 'username': p.username, 'is_ai': p.is_ai} for p in players]
-            logger.info(f"DEBUG: Sending voting_started with players: {voting_players}")
+            logger.debug("Sending voting_started with players: %s", voting_players)
             self.socketio.emit('voting_started', {
                 'players': voting_players
             }, room=room)
@@ -375,38 +696,39 @@ class GameManager:
             # Have AI players vote automatically
             for player in players:
                 if player.is_ai:
-                    logger.info(f"DEBUG: AI {player.username} will vote automatically")
-                    ai_vote_with_delay(self.socketio, lobby, players, player.sid, self)
+                    logger.debug("AI %s will vote automatically", player.username)
+                    ai_vote_with_delay(self.socketio, room, players, player.sid, self)
             
-            self.update_activity()
+            self.update_activity(room, lobby.state)
             
         except Exception as e:
-            logger.error(f"Error starting voting: {e}")
+            logger.error("Error starting voting: %s", e)
         finally:
-            session.close()
+            close_db_session(session)
     
     def handle_vote(self, voter_sid, voted_for_sid, room="main"):
         """Handle a player's vote."""
-        session = SessionLocal()
+        session = get_db_session()
         try:
-            lobby = get_lobby(session, room)
+            lobby = get_lobby(session, room, with_players=True)
             
             if lobby.state != 'voting':
-                logger.info(f"DEBUG: Vote rejected - game state is {lobby.state}")
+                logger.debug("Vote rejected - game state is %s", lobby.state)
                 return
+            players = lobby.players
+            by_sid = {p.sid: p for p in players}
             
             from models.database import Vote
             # Record the vote
             vote = Vote(voter_sid=voter_sid, voted_for_sid=voted_for_sid, lobby_id=lobby.id)
             session.add(vote)
-            session.commit()
             
             # Get voter and target names for logging
-            voter = get_player_by_sid(session, lobby, voter_sid)
+            voter = by_sid.get(voter_sid)
             if voted_for_sid == 'pass':
                 target_name = 'pass'
             else:
-                target = get_player_by_sid(session, lobby, voted_for_sid)
+                target = by_sid.get(voted_for_sid)
                 target_name = target.username if target else voted_for_sid
             
             voter_name = voter.username if voter else voter_sid
@@ -416,14 +738,16 @@ class GameManager:
                 message = f"{voter_name} chose to pass"
             else:
                 message = f"{voter_name} voted for {target_name}"
+            # The vote and its chat line are committed together, before the tally below
             add_message(session, lobby, message)
             
-            # Check if all players have voted
-            players = get_players(session, lobby)
-            total_votes = session.query(Vote).filter_by(lobby_id=lobby.id).count()
+            # Check if all players have voted; one query serves the count and, if it's
+            # the last vote, the tally
+            votes = get_votes_by_voter(session, lobby)
+            total_votes = len(votes)
             
-            logger.info(f"DEBUG: Vote recorded - {voter_name} voted for {target_name}")
-            logger.info(f"DEBUG: Total votes: {total_votes}/{len(players)}")
+            logger.debug("Vote recorded - %s voted for %s", voter_name, target_name)
+            logger.debug("Total votes: %s/%s", total_votes, len(players))
             
             # Send vote status update
             self.socketio.emit('vote_status_update', {
@@ -433,67 +757,64 @@ class GameManager:
             }, room=room)
             
             if total_votes >= len(players):
-                logger.info(f"DEBUG: All players have voted, processing results...")
-                self.process_voting_results(room)
+                logger.debug("All players have voted, processing results...")
+                self.process_voting_results(room, votes)
             
-            self.update_activity()
+            self.update_activity(room, lobby.state)
             
         except Exception as e:
-            logger.error(f"Error handling vote: {e}")
+            logger.error("Error handling vote: %s", e)
         finally:
-            session.close()
+            close_db_session(session)
     
     def request_vote(self, requester_sid, room="main"):
         """Handle a player's request to start voting."""
-        session = SessionLocal()
+        session = get_db_session()
         try:
             lobby = get_lobby(session, room)
             
             if lobby.state != 'playing':
-                logger.info(f"DEBUG: Vote request rejected - game state is {lobby.state}")
+                logger.debug("Vote request rejected - game state is %s", lobby.state)
                 return False, "Game is not in playing state"
             
             if lobby.question_count < 5:
-                logger.info(f"DEBUG: Vote request rejected - only {lobby.question_count} questions asked")
+                logger.debug("Vote request rejected - only %s questions asked", lobby.question_count)
                 return False, f"Need at least 5 questions before voting (currently {lobby.question_count})"
             
             # Check if voting is already in progress
             if lobby.state == 'voting':
                 return False, "Voting is already in progress"
             
-            logger.info(f"DEBUG: Starting voting by player request after {lobby.question_count} questions")
+            logger.debug("Starting voting by player request after %s questions", lobby.question_count)
             self.start_voting(room)
             return True, "Voting started"
             
         except Exception as e:
-            logger.error(f"Error requesting vote: {e}")
+            logger.error("Error requesting vote: %s", e)
             return False, "Error starting vote"
         finally:
-            session.close()
+            close_db_session(session)
     
-    def process_voting_results(self, room="main"):
-        """Process voting results and determine winner."""
-        session = SessionLocal()
+    def process_voting_results(self, room="main", votes=None):
+        """Process voting results and determine winner; votes is get_votes_by_voter() if the caller has it."""
+        session = get_db_session()
         try:
-            lobby = get_lobby(session, room)
-            players = get_players(session, lobby)
-            
-            # Count votes (including passes)
-            vote_counts = {}
-            pass_count = 0
+            lobby = get_lobby(session, room, with_players=True)
+            players = lobby.players
             
-            for player in players:
-                count = get_vote_count(session, lobby, player.sid)
-                vote_counts[player.sid] = count
-            
-            # Count pass votes
-            pass_count = get_vote_count(session, lobby, 'pass')
+            # Count votes (including passes), one per voter
+            if votes is None:
+                votes = get_votes_by_voter(session, lobby)
+            tally = Counter(votes.values())
+            pass_count = tally.pop('pass', 0)
+            by_sid = {p.sid: p for p in players}
+            vote_counts = Counter({sid: count for sid, count in tally.items() if sid in by_sid})
             
-            logger.info(f"DEBUG: Vote counts: {vote_counts}, Pass count: {pass_count}")
+            logger.debug("Vote counts: %s, Pass count: %s", dict(vote_counts), pass_count)
             
             # Find player(s) with most votes (excluding passes)
             if vote_counts:
-                max_votes = max(vote_counts.values())
+                max_votes = vote_counts.most_common(1)[0][1]
                 eliminated = [sid for sid, count in vote_counts.items() if count == max_votes]
             else:
                 # All votes were passes
@@ -505,7 +826,7 @@ class GameManager:
                 # All votes were passes or no votes cast
                 if pass_count > 0:
                     message = f"Everyone passed! No one was eliminated. The game continues!"
-                    add_message(session, lobby, message)
+                    add_message(session, lobby, message, commit=False)
                     
                     # Continue game
                     self.socketio.emit('voting_results', {
@@ -521,7 +842,7 @@ class GameManager:
                 else:
                     # No votes cast (shouldn't happen)
                     message = "No votes were cast. The game continues!"
-                    add_message(session, lobby, message)
+                    add_message(session, lobby, message, commit=False)
                     
                     # Continue game
                     self.socketio.emit('voting_results', {
@@ -535,7 +856,7 @@ class GameManager:
                     self.start_next_turn(room)
             elif len(eliminated) == 1:
                 eliminated_sid = eliminated[0]
-                eliminated_player = get_player_by_sid(session, lobby, eliminated_sid)
+                eliminated_player = by_sid[eliminated_sid]
                 
                 if eliminated_player.is_ai:
                     # Humans win - they voted out the AI
@@ -555,7 +876,7 @@ class GameManager:
                     # 3+ player tie - eliminate both
                     eliminated_names = []
                     for sid in eliminated:
-                        player = get_player_by_sid(session, lobby, sid)
+                        player = by_sid.get(sid)
                         if player:
                             eliminated_names.append(player.username)
                     
@@ -580,195 +901,188 @@ class GameManager:
                         session.commit()
                         self.start_next_turn(room)
             
+            self.invalidate_lobby_data(room)
+            
         except Exception as e:
-            logger.error(f"Error processing voting results: {e}")
+            logger.error("Error processing voting results: %s", e)
         finally:
-            session.close()
+            close_db_session(session)
     
-    def end_game(self, room="main", winner="", message=""):
-        """End the game and announce winner."""
-        session = SessionLocal()
+    def end_game(self, room="main", winner="", message="", location_guess=None):
+        """End the game and announce winner; a winning location guess is announced in the same frame."""
+        session = get_db_session()
         try:
             lobby = get_lobby(session, room)
             
-            add_message(session, lobby, message)
+            # Committed together with the win counter below
+            if location_guess:
+                add_message(session, lobby, location_guess['message'], commit=False)
+            add_message(session, lobby, message, commit=False)
             
-            logger.info(f"DEBUG: Game ending - Winner: {winner}, Message: {message}")
+            logger.debug("Game ending - Winner: %s, Message: %s", winner, message)
             
             # Increment win counter
             if winner == "humans":
                 counter = increment_human_wins(session, room)
-                logger.info(f"DEBUG: Human wins incremented. Total: {counter.human_wins} humans, {counter.ai_wins} AI")
+                self._remember_win_counts(room, counter)
+                logger.debug("Human wins incremented. Total: %s humans, %s AI", counter.human_wins, counter.ai_wins)
             elif winner == "ai":
                 counter = increment_ai_wins(session, room)
-                logger.info(f"DEBUG: AI wins incremented. Total: {counter.human_wins} humans, {counter.ai_wins} AI")
-            
-            # Send win counter update to all players
-            win_counter = get_win_counter(session, room)
-            logger.info(f"DEBUG: Sending win counter update: {win_counter.human_wins} humans, {win_counter.ai_wins} AI")
+                self._remember_win_counts(room, counter)
+                logger.debug("AI wins incremented. Total: %s humans, %s AI", counter.human_wins, counter.ai_wins)
             
-            self.socketio.emit('game_ended', {
+            game_ended_data = {
                 'winner': winner,
                 'message': message
-            }, room=room)
+            }
+            if location_guess:
+                game_ended_data['location_guess'] = location_guess
+            self.socketio.emit('game_ended', game_ended_data, room=room)
             
             # Use unified reset for game completion
             self.unified_reset(room, "Game completed", preserve_win_counter=True)
             
         except Exception as e:
-            logger.error(f"Error ending game: {e}")
+            logger.error("Error ending game: %s", e)
         finally:
-            session.close()
+            close_db_session(session)
     
     def _perform_database_reset(self, room="main", preserve_win_counter=True):
-        """Perform the actual database reset operations."""
-        logger.info(f"DEBUG: Performing database reset for room: {room}")
-        session = SessionLocal()
+        """Perform the actual database reset operations.
+
+        Win counters live in their own table and are never touched here, so
+        preserve_win_counter only exists for callers that still pass it.
+        """
+        logger.debug("Performing database reset for room: %s", room)
+        session = get_db_session()
         try:
-            # Get current win counter before reset
-            win_counter = get_win_counter(session, room)
-            logger.info(f"DEBUG: Preserving win counter: {{'human_wins': {win_counter.human_wins}, 'ai_wins': {win_counter.ai_wins}}}")
-            
-            # Clear all game data
-            session.query(Message).filter(Message.lobby_id == room).delete()
-            session.query(Player).filter(Player.lobby_id == room).delete()
-            session.query(Lobby).filter(Lobby.id == room).delete()
-            
-            # Create fresh lobby
-            get_lobby(session, room)
-            
-            # Restore win counter if preserving
-            if preserve_win_counter:
-                # The win counter should already exist, but let's make sure it's preserved
-                # The WinCounter table is separate and should persist
-                logger.info(f"DEBUG: Win counter restored: {{'human_wins': {win_counter.human_wins}, 'ai_wins': {win_counter.ai_wins}}}")
-            
+            # Clear this room's players, messages and votes and reopen its lobby
+            reset_lobby(session, room)
             session.commit()
-            logger.info(f"DEBUG: Database reset completed successfully!")
+            self.invalidate_lobby_data(room)
+            logger.debug("Database reset completed successfully!")
             
         except Exception as e:
-            logger.error(f"Error in database reset: {e}")
+            logger.error("Error in database reset: %s", e)
             session.rollback()
             raise
         finally:
-            session.close()
+            close_db_session(session)
     
     def unified_reset(self, room="main", reason="", preserve_win_counter=True):
         """Unified reset function for all reset types."""
-        logger.info(f"DEBUG: Unified reset requested for room: {room}, reason: {reason}")
+        logger.debug("Unified reset requested for room: %s, reason: %s", room, reason)
         try:
             # Set reset flag to prevent new joins
             self.is_resetting = True
             
-            # Stop all timers
-            self.stop_inactivity_timer()
-            self.stop_warning_timer()
+            # Stop watching for inactivity
+            self.stop_inactivity_timer(room)
             
             # Perform database reset
             self._perform_database_reset(room, preserve_win_counter=preserve_win_counter)
             
-            # Send reset message to all clients
+            # Players re-enter the players room when they join the next game
+            self.socketio.close_room(players_room(room))
+            # Clients clear their player list on reset, so the next broadcast sends it in full
+            self._last_sent_players.pop(room, None)
+            # The reset removed every player in the room
+            for sid in [sid for sid, r in self._sid_to_lobby.items() if r == room]:
+                del self._sid_to_lobby[sid]
+            for sid in [sid for sid, entry in self._players_by_sid.items() if entry[0] == room]:
+                self._unindex_player(sid)
+            self._turn_orders.pop(room, None)
+            self._pending_questions.pop(room, None)
+            self._qa_history.pop(room, None)
+            self._rngs.pop(room, None)
+            if REDIS_URL:
+                redis_client.delete(qa_history_key(room), f"{qa_history_key(room)}:pending")
+            self._game_generations[room] = next(self._stamps)
+            
+            # Send reset message to all clients, with the win counts in the same frame
             reset_message = f"🎮 {reason} - Game reset! Ready for new players to join and start a new game!"
-            self.socketio.emit('game_reset', {'message': reset_message}, room=room)
-            
-            # Send win counter update after database reset completes
-            session = SessionLocal()
+            reset_data = {'message': reset_message}
             try:
-                win_counter_after_reset = get_win_counter(session, room)
-                logger.info(f"DEBUG: Sending win counter update after reset: {win_counter_after_reset.human_wins} humans, {win_counter_after_reset.ai_wins} AI")
-                self.socketio.emit('win_counter_update', {
-                    'human_wins': win_counter_after_reset.human_wins,
-                    'ai_wins': win_counter_after_reset.ai_wins
-                }, room=room)
-                logger.info(f"DEBUG: Win counter update event sent after reset")
+                win_counts = self.get_win_counts(room)
+                logger.debug("Sending win counts with reset: %s humans, %s AI", win_counts['human_wins'], win_counts['ai_wins'])
+                reset_data['win_counts'] = win_counts
             except Exception as e:
-                logger.error(f"Error sending win counter update after reset: {e}")
-            finally:
-                session.close()
+                logger.error("Error reading win counts for reset: %s", e)
+            self.socketio.emit('game_reset', reset_data, room=room)
             
             # Clear reset flag after a short delay to allow clients to process the reset
             def clear_flag():
-                time.sleep(1)
                 self.is_resetting = False
-                logger.info(f"DEBUG: Reset flag cleared after {reason}")
+                logger.debug("Reset flag cleared after %s", reason)
             
-            thread = threading.Thread(target=clear_flag)
-            thread.daemon = True
-            thread.start()
+            run_after(self.socketio, 1, clear_flag)
             
-            logger.info(f"DEBUG: Unified reset completed for {reason}")
+            logger.debug("Unified reset completed for %s", reason)
             
         except Exception as e:
-            logger.error(f"Error in unified reset: {e}")
+            logger.error("Error in unified reset: %s", e)
             self.is_resetting = False
     
-    def update_activity(self):
-        """Update the last activity timestamp and reset timer if game is active."""
-        session = SessionLocal()
-        try:
-            lobby = get_lobby(session, room="main")
-            # Only update activity and reset timer if game is actively playing
-            if lobby.state in ['playing', 'voting']:
-                self.last_activity = time.time()
-                logger.info(f"Activity updated at {self.last_activity}")
-                if self.inactivity_timer:
-                    self.inactivity_timer.cancel()
-                self.reset_inactivity_timer()
-        except Exception as e:
-            logger.error(f"Error updating activity: {e}")
-        finally:
-            session.close()
+    def update_activity(self, room="main", state=None):
+        """Record an action in a room and restart its inactivity countdown while its game is running.
+
+        state is the lobby state the caller already loaded, so no query is needed here.
+        """
+        if state in ('playing', 'voting'):
+            self.reset_inactivity_timer(room)
+            logger.debug("Activity updated for %s", room)
 
     def get_question_count(self, room="main"):
         """Get the current question count for a room."""
-        session = SessionLocal()
+        session = get_db_session()
         try:
             lobby = get_lobby(session, room)
             return lobby.question_count
         except Exception as e:
-            logger.error(f"Error getting question count: {e}")
+            logger.error("Error getting question count: %s", e)
             return 0
         finally:
-            session.close()
+            close_db_session(session)
     
-    def stop_inactivity_timer(self):
-        """Stop the inactivity timer."""
-        if self.inactivity_timer:
-            self.inactivity_timer.cancel()
-            self.inactivity_timer = None
+    def stop_inactivity_timer(self, room="main"):
+        """Stop watching a room for inactivity."""
+        self._last_activity.pop(room, None)
+        self._inactivity_paused.discard(room)
+        self._inactivity_warned.discard(room)
     
     def reset_inactivity_timer(self, room="main"):
-        """Reset the inactivity timer with 5-minute timeout and 1-minute warning."""
-        # Stop any existing timers
-        self.stop_inactivity_timer()
-        self.stop_warning_timer()
-        
-        # Only start timer if game is active
-        session = SessionLocal()
-        try:
-            lobby = get_lobby(session, room)
-            if lobby.state in ['playing', 'voting']:
-                # Start warning timer (4 minutes = 240 seconds)
-                self.warning_timer = threading.Timer(240.0, self.handle_warning, args=[room])
-                self.warning_timer.daemon = True
-                self.warning_timer.start()
-                
-                # Start inactivity timer (5 minutes = 300 seconds)
-                self.inactivity_timer = threading.Timer(300.0, self.handle_inactivity, args=[room])
-                self.inactivity_timer.daemon = True
-                self.inactivity_timer.start()
-                
-                logger.info(f"DEBUG: Inactivity timers started - warning in 4 minutes, reset in 5 minutes")
-        except Exception as e:
-            logger.error(f"Error resetting inactivity timer: {e}")
-        finally:
-            session.close()
+        """Restart the 5-minute inactivity countdown (with its 1-minute warning) for an active game."""
+        self._last_activity[room] = time.time()
+        self._inactivity_paused.discard(room)
+        self._inactivity_warned.discard(room)
+        if not self._inactivity_monitor_started:
+            # One long-lived task checks the clock instead of a pair of timers per action
+            self._inactivity_monitor_started = True
+            self.socketio.start_background_task(self._inactivity_monitor)
+            logger.info("Inactivity monitor started")
+    
+    def _inactivity_monitor(self):
+        """Periodically warn about, then reset, games that have gone quiet."""
+        while True:
+            self.socketio.sleep(INACTIVITY_CHECK_INTERVAL)
+            now = time.time()
+            for room, last in list(self._last_activity.items()):
+                if room in self._inactivity_paused:
+                    continue
+                idle = now - last
+                try:
+                    if idle >= INACTIVITY_RESET_AFTER:
+                        self.handle_inactivity(room)
+                    elif idle >= INACTIVITY_WARNING_AFTER and room not in self._inactivity_warned:
+                        self._inactivity_warned.add(room)
+                        self.handle_warning(room)
+                except Exception as e:
+                    logger.error("Error in inactivity monitor: %s", e)
     
     def handle_warning(self, room="main"):
         """Handle inactivity warning (1 minute before reset)."""
-        current_time = time.time()
-        if current_time - self.last_activity >= 240:  # 4 minutes
-            logger.info(f"Inactivity warning for room {room}")
+        if time.time() - self._last_activity.get(room, time.time()) >= INACTIVITY_WARNING_AFTER:
+            logger.info("Inactivity warning for room %s", room)
             self.socketio.emit('game_update', {
                 'log': '⚠️ Warning: Game will reset in 1 minute due to inactivity!',
                 'error': True
@@ -776,31 +1090,22 @@ class GameManager:
     
     def handle_inactivity(self, room="main"):
         """Handle inactivity timeout (5 minutes)."""
-        current_time = time.time()
-        if current_time - self.last_activity >= 300:  # 5 minutes
-            logger.info(f"Inactivity timeout for room {room}")
+        if time.time() - self._last_activity.get(room, time.time()) >= INACTIVITY_RESET_AFTER:
+            logger.info("Inactivity timeout for room %s", room)
             self.unified_reset(room, "Inactivity timeout", preserve_win_counter=True)
     
-    def stop_warning_timer(self):
-        """Stop the warning timer."""
-        if self.warning_timer:
-            self.warning_timer.cancel()
-            self.warning_timer = None
-    
-    def pause_inactivity_timer(self):
-        """Pause the inactivity timer during AI operations."""
-        if self.inactivity_timer:
-            self.inactivity_timer.cancel()
-        if self.warning_timer:
-            self.warning_timer.cancel()
-        logger.info("Inactivity timers paused during AI operation")
+    def pause_inactivity_timer(self, room="main"):
+        """Pause a room's inactivity timer during AI operations."""
+        self._inactivity_paused.add(room)
+        logger.debug("Inactivity timer for %s paused during AI operation", room)
 
-    def resume_inactivity_timer(self):
-        """Resume the inactivity timer after AI operations."""
-        self.update_activity()
-        logger.info("Inactivity timers resumed after AI operation")
+    def resume_inactivity_timer(self, room="main"):
+        """Resume a room's inactivity timer after AI operations; the AI's turn counts as activity."""
+        if room in self._last_activity:
+            self.reset_inactivity_timer(room)
+        logger.debug("Inactivity timer for %s resumed after AI operation", room)
 
     def clear_reset_flag(self):
         """Clear the reset flag to allow new joins and game starts."""
         self.is_resetting = False
-        logger.info("DEBUG: Reset flag cleared") 
\ No newline at end of file
+        logger.debug("Reset flag cleared")
\ No newline at end of file
@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+# Usage: gunicorn -c gunicorn.conf.py app:app
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Flask-SocketIO runs on eventlet by default; one green-thread worker handles many
+# sockets. SOCKETIO_ASYNC_MODE=threading uses a thread per connection instead; the
+# gthread worker has no WebSocket support of its own, so the upgrade is served by
+# simple-websocket (in requirements.txt). Without it clients stay on long-polling.
+async_mode = os.getenv("SOCKETIO_ASYNC_MODE", "eventlet").lower()
+worker_class = "eventlet" if async_mode == "eventlet" else "gthread"
+
+# Game state (turn bookkeeping, sid index, win counts) lives in each process, so
+# run one worker unless REDIS_URL is set and the load balancer pins each client
+# to a worker (sticky sessions) - Socket.IO polling breaks without it.
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 1000))
+threads = int(os.getenv("WORKER_THREADS", 100))  # gthread only: concurrent connections per worker
+
+timeout = 60
+keepalive = 65  # outlive typical proxy idle timeouts so connections get reused
+graceful_timeout = 30
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
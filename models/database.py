@@ -1,43 +1,88 @@
 import os
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Text
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
-from sqlalchemy.pool import NullPool
-from config.settings import DATABASE_URL
+from contextvars import ContextVar
+from functools import wraps
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Text, Index, text, select, delete
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship, joinedload
+from sqlalchemy.pool import NullPool, StaticPool
+from config.settings import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
 
 logger = logging.getLogger(__name__)
 
 # Database Setup
 Base = declarative_base()
 
-# Create engine with NullPool to avoid concurrency conflicts with eventlet
-# NullPool creates a new connection for each request and closes it immediately,
-# avoiding the locking issues that occur with SQLAlchemy's default QueuePool
-# when used with eventlet's greenlet-based concurrency
-if DATABASE_URL.startswith('sqlite'):
+if DATABASE_URL in ('sqlite://', 'sqlite:///:memory:'):
+    # An in-memory database lives only as long as its connection, so keep exactly one
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+elif DATABASE_URL.startswith('sqlite'):
+    # SQLite connections are a file open, so there is nothing worth pooling
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=NullPool)
 else:
-    # For PostgreSQL, use NullPool to avoid eventlet concurrency issues
-    engine = create_engine(DATABASE_URL, poolclass=NullPool)
+    # Reuse connections instead of paying TCP + auth on every session. The gunicorn
+    # eventlet worker monkey-patches threading, so QueuePool's lock is green-aware.
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,  # fail fast instead of queueing handlers for 30s
+        pool_pre_ping=True,  # drop connections the server closed while idle
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_use_lifo=True  # reuse the warmest connection; idle extras age out
+    )
 
-# Create simple session factory
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Create simple session factory. Objects keep their loaded values after a commit:
+# one session serves a whole event (see with_session), and handlers that commit
+# part-way through would otherwise re-SELECT every row they touch next. Work that
+# waits on something slow (the AI's OpenAI calls) reads in short sessions of its
+# own on either side of the wait instead of holding one open across it.
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+
+# Session shared by everything one socket event or background task touches
+_current_session = ContextVar('current_session', default=None)
 
 def get_db_session():
-    """Get a database session with error handling."""
+    """Get a database session, reusing the one bound by with_session if there is one."""
+    session = _current_session.get()
+    if session is not None:
+        return session
     try:
         return SessionLocal()
     except Exception as e:
-        logger.error(f"Error creating database session: {e}")
+        logger.error("Error creating database session: %s", e)
         raise
 
 def close_db_session(session):
-    """Safely close a database session with error handling."""
+    """Safely close a database session; a with_session one stays open until its scope ends."""
     try:
-        if session:
+        if session and session is not _current_session.get():
             session.close()
     except Exception as e:
-        logger.error(f"Error closing session: {e}")
+        logger.error("Error closing session: %s", e)
+
+def with_session(fn):
+    """Bind one session to everything fn calls, so nested get_db_session() calls share it.
+
+    A handler that starts a game and then the first turn checks out a single
+    pooled connection instead of one per step. Callers still commit their own
+    work; anything left uncommitted is discarded when the scope closes.
+
+    Background tasks don't inherit the binding: threads and green threads start
+    with an empty context, so each task (AI turns, the inactivity monitor) gets
+    its own sessions rather than sharing the handler's across threads.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _current_session.get() is not None:
+            return fn(*args, **kwargs)
+        session = SessionLocal()
+        token = _current_session.set(session)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_session.reset(token)
+            session.close()
+    return wrapper
 
 from contextlib import contextmanager
 
@@ -78,12 +123,17 @@ class Player(Base):
     is_ai = Column(Boolean, default=False)
     lobby_id = Column(Integer, ForeignKey('lobbies.id'))
     lobby = relationship('Lobby', back_populates='players')
+    
+    __table_args__ = (
+        Index('ix_players_lobby_username', 'lobby_id', 'username'),
+        Index('ix_players_lobby_sid', 'lobby_id', 'sid'),  # also serves lobby-wide player loads
+    )
 
 class Message(Base):
     __tablename__ = 'messages'
     id = Column(Integer, primary_key=True)
     content = Column(Text)
-    lobby_id = Column(Integer, ForeignKey('lobbies.id'))
+    lobby_id = Column(Integer, ForeignKey('lobbies.id'), index=True)
     lobby = relationship('Lobby', back_populates='messages')
 
 class Vote(Base):
@@ -93,27 +143,88 @@ class Vote(Base):
     voted_for_sid = Column(String)  # Who they voted for
     lobby_id = Column(Integer, ForeignKey('lobbies.id'))
     lobby = relationship('Lobby')
+    
+    __table_args__ = (
+        Index('ix_votes_lobby_voted_for', 'lobby_id', 'voted_for_sid'),
+    )
 
 class WinCounter(Base):
     __tablename__ = 'win_counters'
     id = Column(Integer, primary_key=True)
     human_wins = Column(Integer, default=0)
     ai_wins = Column(Integer, default=0)
-    room = Column(String, default='main')  # In case we want multiple rooms later
+    room = Column(String, default='main', index=True)  # In case we want multiple rooms later
 
 # Create all tables
 Base.metadata.create_all(engine)
 
+# create_all skips tables that already exist, so add any index they are missing
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+
 # Database helper functions
-def get_lobby(session, room="main"):
-    """Get or create a lobby for the given room."""
-    lobby = session.query(Lobby).filter_by(room=room).first()
+def get_lobby(session, room="main", with_players=False, fresh=False):
+    """Get or create a lobby for the given room, optionally loading its players in the same query.
+
+    fresh=True overwrites a copy the session already holds with the current row.
+    """
+    query = session.query(Lobby)
+    if fresh:
+        query = query.populate_existing()
+    if with_players:
+        query = query.options(joinedload(Lobby.players))
+    lobby = query.filter_by(room=room).first()
     if not lobby:
         lobby = Lobby(room=room)
         session.add(lobby)
         session.commit()
     return lobby
 
+def get_lobby_rows(session, room="main"):
+    """Plain rows of (room, state, question_count, sid, username, is_ai), one per player, in one query.
+
+    For read-only views: no ORM objects are built. A lobby without players gives
+    one row with the player columns None; a missing lobby gives no rows.
+    """
+    return (
+        session.query(Lobby.room, Lobby.state, Lobby.question_count, Player.sid, Player.username, Player.is_ai)
+        .outerjoin(Player, Player.lobby_id == Lobby.id)
+        .filter(Lobby.room == room)
+        .order_by(Player.id)
+        .all()
+    )
+
+def reset_lobby(session, room="main"):
+    """Delete a room's players, messages and votes and put its lobby back to 'waiting'.
+
+    Bulk deletes keyed on the lobby id; the caller commits. Win counters are untouched.
+    """
+    lobby = session.query(Lobby).filter_by(room=room).first()
+    if not lobby:
+        return get_lobby(session, room)
+    for model in (Vote, Message, Player):
+        session.query(model).filter_by(lobby_id=lobby.id).delete()
+    session.expire(lobby)  # drop any loaded players/messages collections
+    lobby.state = 'waiting'
+    lobby.location = None
+    lobby.outsider_sid = None
+    lobby.turn = 0
+    lobby.player_order = ''
+    lobby.question_count = 0
+    lobby.current_question_asker = None
+    lobby.current_target = None
+    return lobby
+
+def clear_game_tables():
+    """Empty every per-game table at once, keeping win counters. Only safe with no games running."""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text("TRUNCATE votes, messages, players, lobbies RESTART IDENTITY"))
+        else:
+            for model in (Vote, Message, Player, Lobby):
+                conn.execute(model.__table__.delete())
+
 def get_players(session, lobby):
     """Get all players in a lobby."""
     return session.query(Player).filter_by(lobby_id=lobby.id).all()
@@ -122,21 +233,32 @@ def get_player_by_sid(session, lobby, sid):
     """Return the Player object for a given sid in a lobby, or None if not found."""
     return session.query(Player).filter_by(lobby_id=lobby.id, sid=sid).first()
 
-def add_message(session, lobby, content):
-    """Add a message to the lobby."""
+def add_message(session, lobby, content, commit=True):
+    """Add a message to the lobby; pass commit=False to fold it into the caller's next commit."""
     msg = Message(content=content, lobby=lobby)
     session.add(msg)
-    session.commit()
+    if commit:
+        session.commit()
 
-def clear_votes(session, lobby):
+def clear_votes(session, lobby, commit=True):
     """Clear all votes for a lobby."""
     session.query(Vote).filter_by(lobby_id=lobby.id).delete()
-    session.commit()
+    if commit:
+        session.commit()
 
 def get_vote_count(session, lobby, target_sid):
     """Get the number of votes for a specific player."""
     return session.query(Vote).filter_by(lobby_id=lobby.id, voted_for_sid=target_sid).count()
 
+def get_votes_by_voter(session, lobby):
+    """Map each voter's sid to the target of their latest vote, in one query.
+
+    Its length is the number of players who have voted; Counter(votes.values())
+    is the tally, with a changed vote counted once.
+    """
+    rows = session.query(Vote.voter_sid, Vote.voted_for_sid).filter_by(lobby_id=lobby.id).order_by(Vote.id)
+    return dict(rows)
+
 def get_player_by_username(session, lobby, username):
     """Return the Player object for a given username in a lobby, or None if not found."""
     return session.query(Player).filter_by(lobby_id=lobby.id, username=username).first()
@@ -146,9 +268,30 @@ def remove_player(session, player):
     session.delete(player)
     session.commit()
 
-def get_messages(session, lobby):
-    """Get all messages in a lobby."""
-    return session.query(Message).filter_by(lobby_id=lobby.id).order_by(Message.id).all()
+def delete_player_by_sid(session, room, sid, player_id=None):
+    """Delete a room's player by sid and return their username, or None if there was none.
+
+    One DELETE ... RETURNING where the database supports it, keyed on the primary
+    key when the caller knows it. The caller commits.
+    """
+    condition = Player.id == player_id if player_id is not None else (
+        Player.lobby_id == select(Lobby.id).where(Lobby.room == room).scalar_subquery()
+    )
+    stmt = delete(Player).where(condition, Player.sid == sid)
+    if engine.dialect.delete_returning:
+        return session.execute(stmt.returning(Player.username)).scalar()
+    username = session.execute(select(Player.username).where(condition, Player.sid == sid)).scalar()
+    if username is not None:
+        session.execute(stmt)
+    return username
+
+def get_messages(session, lobby, limit=None):
+    """Get a lobby's messages, oldest first; with limit, only the latest ones."""
+    query = session.query(Message).filter_by(lobby_id=lobby.id)
+    if limit is None:
+        return query.order_by(Message.id).all()
+    # Read the tail newest-first so the database stops after `limit` rows
+    return query.order_by(Message.id.desc()).limit(limit).all()[::-1]
 
 def get_win_counter(session, room="main"):
     """Get the win counter for a room, creating it if it doesn't exist."""
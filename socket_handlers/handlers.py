@@ -1,13 +1,18 @@
+from functools import wraps
+import itertools
+import secrets
+import time
 from flask import request
 from flask_socketio import join_room, emit
 from models.database import (
-    SessionLocal, get_lobby, get_players, get_player_by_sid, 
-    get_player_by_username, add_message, get_win_counter, 
-    get_db_session, close_db_session, get_db
+    get_lobby, 
+    get_player_by_username, add_message, 
+    get_db_session, close_db_session, get_db, with_session, delete_player_by_sid, Player
 )
-from game.logic import GameManager
+from game.logic import GameManager, rooms_for_player
 from game.ai import get_random_ai_name
-from config.settings import DEBUG
+from utils.lru import LRUDict
+from config.settings import DEBUG, CONNECTION_LOG_SAMPLE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,6 +21,78 @@ logger = logging.getLogger(__name__)
 _socketio = None
 _game_manager = None
 
+def enter_rooms(sid, rooms):
+    """Add a client to several rooms in one pass."""
+    for room in rooms:
+        _socketio.server.enter_room(sid, room, namespace='/')
+
+# Per-sid token buckets for events that trigger room-wide broadcasts.
+# Each entry is (tokens, last_refill); buckets are dropped on disconnect.
+RATE_LIMIT_PER_SECOND = 5
+RATE_LIMIT_BURST = 10
+_buckets = LRUDict(10000)  # bounded in case a disconnect is never delivered
+
+def allow_event(sid, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST):
+    """Take one token from a client's bucket; False when the client is over its limit."""
+    now = time.monotonic()
+    tokens, last = _buckets.get(sid, (burst, now))
+    tokens = min(burst, tokens + (now - last) * rate)
+    if tokens < 1:
+        _buckets[sid] = (tokens, now)
+        return False
+    _buckets[sid] = (tokens - 1, now)
+    return True
+
+_connection_events = itertools.count()
+
+def log_connection_event(msg, sid):
+    """Log a connect/disconnect at INFO for one in CONNECTION_LOG_SAMPLE events, DEBUG otherwise."""
+    level = logging.INFO if next(_connection_events) % CONNECTION_LOG_SAMPLE == 0 else logging.DEBUG
+    logger.log(level, msg, sid)
+
+def parse_payload(data, fields):
+    """Pull required, non-empty string fields out of an event payload.
+
+    Returns (values, error); values has the stripped strings, error is the
+    message for the first field that failed. Plain type checks only, so junk
+    traffic is turned away before any database or GameManager work.
+    """
+    if not isinstance(data, dict):
+        return None, 'Invalid request.'
+    values = {}
+    for name, message in fields.items():
+        value = data.get(name)
+        if not isinstance(value, str) or not value.strip():
+            return None, message
+        values[name] = value.strip()
+    return values, None
+
+def socket_handler(fields=None, error_message='An error occurred. Please try again.', rate_limited=False):
+    """Validate an event payload and turn failures into an error game_update for the sender.
+
+    The handler runs with one database session shared by everything it calls.
+    """
+    def decorator(fn):
+        scoped = with_session(fn)
+        @wraps(fn)
+        def wrapper(data=None):
+            if rate_limited and not allow_event(request.sid):
+                emit('game_update', {'log': 'You are doing that too often. Please slow down.', 'error': True}, room=request.sid)
+                return
+            payload = data
+            if fields:
+                payload, error = parse_payload(data, fields)
+                if error:
+                    emit('game_update', {'log': error, 'error': True}, room=request.sid)
+                    return
+            try:
+                return scoped(payload)
+            except Exception:
+                logger.exception("Error in %s", fn.__name__)
+                emit('game_update', {'log': error_message, 'error': True}, room=request.sid)
+        return wrapper
+    return decorator
+
 def register_handlers(socketio, game_manager):
     global _socketio, _game_manager
     _socketio = socketio
@@ -25,49 +102,47 @@ def register_handlers(socketio, game_manager):
     
     @socketio.on_error_default
     def default_error_handler(e):
-        logger.error(f"SocketIO error: {e}")
+        logger.error("SocketIO error: %s", e)
         emit('game_update', {'log': 'An internal error occurred. Please try again.'})
 
     @socketio.on('join_room')
+    @socket_handler()
     def handle_join_room(data):
-        room = data.get('room', 'main')
-        logger.info(f"Join room event received: {data}")
+        room = (data or {}).get('room', 'main')
+        logger.info("Join room event received: %s", data)
         
         # Join the room
         join_room(room)
-        logger.info(f"Client joined room: {room}")
+        logger.info("Client joined room: %s", room)
         
         # Debug: Check if client is actually in the room
         from flask_socketio import rooms
         client_rooms = rooms()
-        logger.info(f"Client rooms after joining: {client_rooms}")
+        logger.info("Client rooms after joining: %s", client_rooms)
         
         # Send confirmation
         emit('room_joined', {'room': room, 'status': 'success'})
 
     @socketio.on('test_room')
     def on_test_room(data):
-        logger.info(f"Test room event received: {data}")
+        logger.info("Test room event received: %s", data)
         # Echo back to the room to test communication
         emit('test_room_response', {'message': 'Room communication working!', 'original': data}, room='main')
 
     @socketio.on('join')
+    @socket_handler({'username': 'Username is required.'}, 'An error occurred while joining the game.')
     def on_join(data):
         """Handle player join request."""
-        logger.info(f"Join event received with data: {data}")
-        username = data.get('username', '').strip()
+        logger.info("Join event received with data: %s", data)
+        username = data['username']
         current_sid = request.sid
         room = 'main'
         
-        logger.info(f"Processing join for username: {username}, current_sid: {current_sid}, room: {room}")
-        
-        if not username:
-            emit('game_update', {'log': 'Username is required.'}, room=current_sid)
-            return
+        logger.info("Processing join for username: %s, current_sid: %s, room: %s", username, current_sid, room)
         
         # Check if game is currently resetting
         if _game_manager.is_resetting:
-            logger.info(f"Game is currently resetting, rejecting join request")
+            logger.info("Game is currently resetting, rejecting join request")
             emit('game_update', {
                 'log': 'Game is currently resetting. Please wait a moment and try again.',
                 'error': True
@@ -77,21 +152,22 @@ def register_handlers(socketio, game_manager):
         # Use simplified session management for production
         session = None
         try:
-            logger.info(f"Creating database session...")
-            session = SessionLocal()
-            logger.info(f"Database session created successfully")
+            logger.info("Creating database session...")
+            session = get_db_session()
+            logger.info("Database session created successfully")
             
-            lobby = get_lobby(session, room)
-            logger.info(f"Got lobby: {lobby.room}, state: {lobby.state}")
+            # The player checks below all read this one joined load instead of querying again
+            lobby = get_lobby(session, room, with_players=True)
+            logger.info("Got lobby: %s, state: %s", lobby.room, lobby.state)
             
             # Check if a game is already in progress
             if lobby.state in ['playing', 'voting']:
-                logger.info(f"Game already in progress, putting {username} in spectator mode")
+                logger.info("Game already in progress, putting %s in spectator mode", username)
                 
                 # Check if username is already taken by a different player
-                existing_player = get_player_by_username(session, lobby, username)
+                existing_player = next((p for p in lobby.players if p.username == username), None)
                 if existing_player and existing_player.sid != current_sid:
-                    logger.info(f"Username {username} is already taken by different player")
+                    logger.info("Username %s is already taken by different player", username)
                     emit('game_update', {
                         'log': f'Username "{username}" is already taken. Please choose a different name.',
                         'error': True
@@ -100,19 +176,20 @@ def register_handlers(socketio, game_manager):
                 
                 # Don't add spectator to database - just join room and send spectator mode
                 # Get current game state
-                players = get_players(session, lobby)
-                active_players = [p for p in players if not p.is_ai]  # Only human players for spectator view
-                player_names = [p.username for p in active_players]
+                lobby_data = _game_manager.get_lobby_data(room)
+                # Only human players for spectator view
+                player_names = [p['username'] for p in lobby_data['players'] if not p['is_ai']]
+                question_count = lobby_data['question_count']
                 
                 # Join the room and send spectator mode data
-                join_room(room)
+                enter_rooms(current_sid, rooms_for_player(room, is_spectator=True))
                 
                 # Send spectator mode to the joining player
                 emit('spectator_mode', {
                     'message': f'Game in progress! You are spectating as {username}.',
                     'players': player_names,
-                    'question_count': lobby.question_count,
-                    'questions_until_vote': max(0, 5 - lobby.question_count)
+                    'question_count': question_count,
+                    'questions_until_vote': max(0, 5 - question_count)
                 }, room=current_sid)
                 
                 # Only send a chat message notification, don't update the player list for active players
@@ -123,13 +200,13 @@ def register_handlers(socketio, game_manager):
                 # Add spectator join message to game chat
                 add_message(session, lobby, f"{username} joined as a spectator.")
                 
-                logger.info(f"Spectator {username} joined the game in progress")
+                logger.info("Spectator %s joined the game in progress", username)
                 return
             
             # Check if username is already taken by a different player
-            existing_player = get_player_by_username(session, lobby, username)
+            existing_player = next((p for p in lobby.players if p.username == username), None)
             if existing_player and existing_player.sid != current_sid:
-                logger.info(f"Username {username} is already taken by different player")
+                logger.info("Username %s is already taken by different player", username)
                 emit('game_update', {
                     'log': f'Username "{username}" is already taken. Please choose a different name.',
                     'error': True
@@ -137,244 +214,204 @@ def register_handlers(socketio, game_manager):
                 return
             
             # Check if current SID already has a player
-            existing_sid_player = get_player_by_sid(session, lobby, current_sid)
+            existing_sid_player = next((p for p in lobby.players if p.sid == current_sid), None)
             if existing_sid_player:
                 # Update username if it changed
                 if existing_sid_player.username != username:
                     existing_sid_player.username = username
                     session.commit()
-                    logger.info(f"Updated username for existing player: {username}")
+                    logger.info("Updated username for existing player: %s", username)
+                _game_manager.index_player(room, existing_sid_player)
             else:
                 # Create new player
-                from models.database import Player
                 new_player = Player(sid=current_sid, username=username, is_ai=False, lobby=lobby)
                 session.add(new_player)
                 session.commit()
-                logger.info(f"Created new player: {username} with SID: {current_sid}")
+                _game_manager.index_player(room, new_player)
+                logger.info("Created new player: %s with SID: %s", username, current_sid)
+            
+            _game_manager.register_player(current_sid, room)
             
-            # Create AI player if this is the first human player
-            players = get_players(session, lobby)
-            logger.info(f"Current players: {[p.username for p in players]}")
+            # Create AI player if this is the first human player (new players were
+            # appended to lobby.players when they were created with lobby=lobby)
+            players = lobby.players
+            logger.info("Current players: %s", [p.username for p in players])
             if len(players) == 1 and not any(p.is_ai for p in players):
                 # Create AI player
-                ai_name = get_random_ai_name()
-                ai_player = Player(sid=f"ai_{ai_name}", username=ai_name, is_ai=True, lobby=lobby)
+                ai_name = get_random_ai_name({p.username for p in players}, _game_manager.game_rng(room))
+                # Random sid: AI names repeat across lobbies, and sids key the player index
+                ai_player = Player(sid=f"ai_{secrets.token_hex(4)}", username=ai_name, is_ai=True, lobby=lobby)
                 session.add(ai_player)
                 session.commit()
-                logger.info(f"Created AI player: {ai_name}")
+                _game_manager.index_player(room, ai_player)
+                logger.info("Created AI player: %s", ai_name)
             
-            logger.info(f"{username} has joined the room {room}. Current players: {len(get_players(session, lobby))}")
             add_message(session, lobby, f"{username} has joined the room.")
             
-            # Get updated player list after potential AI creation
-            updated_players = get_players(session, lobby)
-            player_names = [p.username for p in updated_players]
-            logger.info(f"Sending game_update with players: {player_names}")
+            # Player list changed (possibly including the new AI)
+            _game_manager.invalidate_lobby_data(room)
+            logger.info("%s has joined the room %s", username, room)
             
-            # Join the room first, then emit
-            join_room(room)
+            # Join the lobby rooms first, then emit
+            enter_rooms(current_sid, rooms_for_player(room))
             
             # Debug: Check if client is actually in the room
             from flask_socketio import rooms
             client_rooms = rooms()
-            logger.info(f"Client rooms after join_room: {client_rooms}")
+            logger.info("Client rooms after join_room: %s", client_rooms)
             
-            # Broadcast updated player list to all players in the room (including the joining player)
-            emit('game_update', {
-                'players': player_names,
-                'log': f"{username} has joined the room.",
-                'can_start_game': len(updated_players) >= 2
-            }, room=room)
-            
-            # Debug: Check room membership after emit
-            room_clients = rooms(room)
-            logger.info(f"Room {room} clients after game_update emit: {room_clients}")
-            
-            # Send current win counter to the joining player
-            win_counter = get_win_counter(session, room)
-            emit('win_counter_update', {
-                'human_wins': win_counter.human_wins,
-                'ai_wins': win_counter.ai_wins
-            }, room=current_sid)
+            # Broadcast updated player list to all players in the room (including the joining player),
+            # coalesced with any other joins/leaves in the same instant
+            _game_manager.schedule_lobby_broadcast(room, f"{username} has joined the room.", joined=True)
             
-            # Also send win counter to all players in the room to ensure everyone has the latest count
-            emit('win_counter_update', {
-                'human_wins': win_counter.human_wins,
-                'ai_wins': win_counter.ai_wins
-            }, room=room)
+            # Send the win counter to the room; the joining player is already in it
+            emit('win_counter_update', _game_manager.get_win_counts(room), room=room)
             
-            logger.info(f"game_update event emitted successfully")
-        except Exception as e:
-            logger.error(f"Error in on_join: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            emit('game_update', {'log': 'An error occurred while joining the game.'}, room=request.sid)
+            logger.info("Join processed for %s", username)
         finally:
             if session:
-                logger.info(f"Closing database session...")
-                session.close()
-                logger.info(f"Database session closed")
+                logger.info("Closing database session...")
+                close_db_session(session)
+                logger.info("Database session closed")
 
     @socketio.on('start_game')
+    @socket_handler(error_message='An error occurred while starting the game.')
     def handle_start_game(data):
         logger.info("=== START GAME EVENT RECEIVED ===")
-        logger.info(f"Start game event received with data: {data}")
-        logger.info(f"Request SID: {request.sid}")
+        logger.info("Start game event received with data: %s", data)
+        logger.info("Request SID: %s", request.sid)
         
         # Debug: Check client rooms
         from flask_socketio import rooms
         client_rooms = rooms()
-        logger.info(f"Client rooms at start_game: {client_rooms}")
+        logger.info("Client rooms at start_game: %s", client_rooms)
         
         # Ensure client is in the main room
         join_room('main')
-        logger.info(f"Client {request.sid} joined room main for start_game")
+        logger.info("Client %s joined room main for start_game", request.sid)
         
         # Call the game manager to start the game
         logger.info("Calling game_manager.start_game...")
         success, message = _game_manager.start_game('main')
-        logger.info(f"Game manager start_game result: success={success}, message={message}")
+        logger.info("Game manager start_game result: success=%s, message=%s", success, message)
         
         if success:
-            logger.info(f"Game started successfully: {message}")
+            logger.info("Game started successfully: %s", message)
             emit('game_update', {'log': message})
         else:
-            logger.error(f"Failed to start game: {message}")
+            logger.error("Failed to start game: %s", message)
             emit('game_update', {'log': f'Error: {message}', 'error': True})
 
     @socketio.on('manual_reset')
+    @with_session
     def handle_manual_reset():
         logger.info("Manual reset event received")
         _game_manager.unified_reset('main', "Manual reset", preserve_win_counter=True)
         logger.info("Manual reset completed")
 
     @socketio.on('ask_question')
+    @socket_handler({
+        'question': 'Question and target are required.',
+        'target': 'Question and target are required.'
+    }, 'An error occurred while processing your question.', rate_limited=True)
     def on_ask_question(data):
-        logger.info(f"=== ASK QUESTION EVENT RECEIVED ===")
-        logger.info(f"Data: {data}")
-        logger.info(f"Request SID: {request.sid}")
+        logger.info("=== ASK QUESTION EVENT RECEIVED ===")
+        logger.info("Data: %s", data)
+        logger.info("Request SID: %s", request.sid)
         
-        question = data.get('question', '').strip()
-        target_username = data.get('target', '').strip()
+        question = data['question']
+        target_username = data['target']
         asker_sid = request.sid
         room = 'main'
         
-        if not question or not target_username:
-            emit('game_update', {'log': 'Question and target are required.'}, room=request.sid)
-            return
-        
-        logger.info(f"Processing question: '{question}' from {asker_sid} to {target_username}")
+        logger.info("Processing question: '%s' from %s to %s", question, asker_sid, target_username)
         
-        session = SessionLocal()
-        try:
+        target_sid = _game_manager.find_sid_by_username(room, target_username)
+        if target_sid is None:
+            # Not indexed in this process (e.g. joined on another worker); ask the database
+            session = get_db_session()
             lobby = get_lobby(session, room)
             target_player = get_player_by_username(session, lobby, target_username)
-            
-            if not target_player:
-                logger.error(f"Target player {target_username} not found")
-                emit('game_update', {'log': f'Player "{target_username}" not found.'}, room=request.sid)
-                return
-            
-            target_sid = target_player.sid
-            logger.info(f"Found target SID: {target_sid}")
-            
-            _game_manager.handle_question(asker_sid, target_sid, question, room)
-            
-        except Exception as e:
-            logger.error(f"Error in ask_question: {e}")
-            emit('game_update', {'log': 'An error occurred while processing your question.'}, room=request.sid)
-        finally:
-            session.close()
+            target_sid = target_player.sid if target_player else None
+        
+        if target_sid is None:
+            logger.error("Target player %s not found", target_username)
+            emit('game_update', {'log': f'Player "{target_username}" not found.'}, room=request.sid)
+            return
+        
+        logger.info("Found target SID: %s", target_sid)
+        _game_manager.handle_question(asker_sid, target_sid, question, room)
 
     @socketio.on('submit_answer')
+    @socket_handler({'answer': 'Answer is required.'}, 'An error occurred while submitting your answer.', rate_limited=True)
     def on_submit_answer(data):
         """Handle answer submission."""
-        answer = data.get('answer', '').strip()
-        target_sid = request.sid
-        room = 'main'
-        
-        if not answer:
-            emit('game_update', {'log': 'Answer is required.'}, room=request.sid)
-            return
-        
-        try:
-            _game_manager.handle_answer(target_sid, answer, room)
-        except Exception as e:
-            logger.error(f"Error in submit_answer: {e}")
-            emit('game_update', {'log': 'An error occurred while submitting your answer.'}, room=request.sid)
+        _game_manager.handle_answer(request.sid, data['answer'], 'main')
 
     @socketio.on('submit_vote')
+    @socket_handler({'voted_for_sid': 'Please select a player to vote for or choose pass.'},
+                    'An error occurred while submitting your vote.', rate_limited=True)
     def on_submit_vote(data):
         """Handle vote submission."""
-        voted_for = data.get('voted_for_sid', '').strip()
-        voter_sid = request.sid
-        room = 'main'
-        
-        if not voted_for:
-            emit('game_update', {'log': 'Please select a player to vote for or choose pass.'}, room=request.sid)
-            return
-        
-        try:
-            _game_manager.handle_vote(voter_sid, voted_for, room)
-        except Exception as e:
-            logger.error(f"Error in submit_vote: {e}")
-            emit('game_update', {'log': 'An error occurred while submitting your vote.'}, room=request.sid)
+        _game_manager.handle_vote(request.sid, data['voted_for_sid'], 'main')
 
     @socketio.on('request_vote')
+    @socket_handler(error_message='An error occurred while requesting a vote.')
     def on_request_vote(data):
         """Handle vote request."""
-        requester_sid = request.sid
-        room = 'main'
-        
-        try:
-            success, message = _game_manager.request_vote(requester_sid, room)
-            if not success:
-                emit('game_update', {'log': message, 'error': True}, room=request.sid)
-            else:
-                emit('game_update', {'log': message}, room=request.sid)
-        except Exception as e:
-            logger.error(f"Error in request_vote: {e}")
-            emit('game_update', {'log': 'An error occurred while requesting a vote.'}, room=request.sid)
+        success, message = _game_manager.request_vote(request.sid, 'main')
+        if not success:
+            emit('game_update', {'log': message, 'error': True}, room=request.sid)
+        else:
+            emit('game_update', {'log': message}, room=request.sid)
 
     @socketio.on('typing_start')
     def on_typing_start(data):
         """Handle typing start event."""
-        try:
-            room = 'main'
-            username = data.get('username')
-            if username:
-                # Broadcast typing indicator to all players in the room
-                emit('typing_start', {'username': username}, room=room, include_self=False)
-        except Exception as e:
-            logger.error(f"Error in typing_start: {e}")
+        # Typing indicators are best-effort; malformed payloads are dropped without a reply
+        payload, error = parse_payload(data, {'username': None})
+        if payload:
+            # Broadcast typing indicator to all players in the room
+            emit('typing_start', {'username': payload['username']}, room='main', include_self=False)
 
     @socketio.on('typing_stop')
     def on_typing_stop(data):
         """Handle typing stop event."""
-        room = 'main'
-        join_room(room)
-        emit('typing_stop', {'username': data.get('username', 'Unknown')}, room=room, include_self=False)
+        payload, error = parse_payload(data, {'username': None})
+        username = payload['username'] if payload else 'Unknown'
+        emit('typing_stop', {'username': username}, room='main', include_self=False)
 
     @socketio.on('disconnect')
-    def handle_disconnect(sid):
-        logger.info(f"Client disconnected: {sid}")
+    @with_session
+    def handle_disconnect(*args):
+        # python-socketio may pass a disconnect reason; the sid always comes from the request
+        sid = request.sid
+        log_connection_event("Client disconnected: %s", sid)
+        _buckets.pop(sid, None)
         
-        # Debug: Check what rooms the client was in
-        from flask_socketio import rooms
-        client_rooms = rooms(sid)
-        logger.info(f"Client {sid} was in rooms: {client_rooms}")
+        # Sockets that never joined as a player have nothing to clean up
+        player_id = _game_manager.get_player_id(sid)
+        room = _game_manager.unregister_player(sid)
+        if room is None:
+            logger.info("No player found for SID: %s", sid)
+            return
         
         # Remove player from database
         try:
-            with SessionLocal() as session:
-                player = get_player_by_sid(session, None, sid)
-                if player:
-                    logger.info(f"Removing player {player.username} from database")
-                    session.delete(player)
-                    session.commit()
-                else:
-                    logger.info(f"No player found for SID: {sid}")
+            session = get_db_session()
+            # One DELETE by primary key for the indexed row; by sid within the lobby otherwise
+            username = delete_player_by_sid(session, room, sid, player_id)
+            if username is None and player_id is not None:
+                username = delete_player_by_sid(session, room, sid)
+            if username is not None:
+                session.commit()
+                logger.info("Removed player %s from database", username)
+                _game_manager.handle_player_left(room, sid)
+                _game_manager.invalidate_lobby_data(room)
+                _game_manager.schedule_lobby_broadcast(room, f"{username} has left the game.")
+            else:
+                logger.info("No player found for SID: %s", sid)
         except Exception as e:
-            logger.error(f"Error removing player on disconnect: {e}")
+            logger.error("Error removing player on disconnect: %s", e)
 
     logger.info("Socket.IO event handlers registered successfully!") 
\ No newline at end of file
@@ -47,7 +47,9 @@ document.addEventListener('DOMContentLoaded', () => {
         isTyping: false,
         typingTimeout: null,
         socket: null,
-        roomJoined: false
+        roomJoined: false,
+        pendingQuestion: null,  // shown once the server accepts it; the broadcast skips the asker
+        pendingAnswer: null
     };
 
     // --- Helper Functions (UI & Logic) ---
@@ -96,6 +98,27 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    /**
+     * Updates the humans vs AI win counter.
+     * @param {object} data The win counts from the server.
+     */
+    function updateWinCounter(data) {
+        DOM.humanWinsDisplay.textContent = data.human_wins;
+        DOM.aiWinsDisplay.textContent = data.ai_wins;
+    }
+
+    /**
+     * Adds an anonymous location guess to the chat log.
+     * @param {object} data The guess, its chat message and whether it was correct.
+     */
+    function showLocationGuess(data) {
+        console.log('Location guess made:', data);
+        
+        // Add anonymous location guess to chat with appropriate emoji
+        const emoji = data.is_correct ? "🎯" : "❌";
+        addMessageToLog(`<strong>${emoji} ${data.message}</strong>`, data.is_correct ? 'success' : 'error');
+    }
+
     /**
      * Updates the question counter and the "vote now" button.
      * @param {object} data The update data from the server.
@@ -250,6 +273,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const question = DOM.questionInput.value.trim();
         const target = DOM.targetPlayerSelect.value;
         if (question && target) {
+            state.pendingQuestion = { question, target };
             state.socket.emit('ask_question', { question, target });
             DOM.questionInput.value = '';
             stopTyping();
@@ -263,6 +287,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (state.isSpectator) return;
         const answer = DOM.answerInput.value.trim();
         if (answer) {
+            state.pendingAnswer = answer;
             state.socket.emit('submit_answer', { answer });
             DOM.answerInput.value = '';
             stopTyping();
@@ -288,7 +313,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Socket.IO Initialization & Handlers ---
     function initializeSocket() {
-        state.socket = io({ transports: ['websocket', 'polling'] });
+        const socketOptions = { transports: ['websocket', 'polling'] };
+        if (window.socketParser) {
+            socketOptions.parser = window.socketParser;
+        }
+        state.socket = io(socketOptions);
 
         // Welcome messages
     addMessageToLog('👋 Welcome to The Outsider!', 'system');
@@ -402,12 +431,18 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             
             resetUIForNewGame();
-            // Win counter is now persistent across all resets (including manual resets)
-            // No longer reset win counter for any type of reset
+            // Win counter is persistent across all resets; the server sends the current counts along
+            if (data.win_counts) {
+                updateWinCounter(data.win_counts);
+            }
         });
 
         state.socket.on('game_ended', (data) => {
             console.log('Game Ended:', data);
+            // A winning location guess is announced in the same frame
+            if (data.location_guess) {
+                showLocationGuess(data.location_guess);
+            }
             setFormVisibility({});
             addMessageToLog(data.message, data.winner === 'humans' ? 'success' : 'error');
             updateTurnIndicator(`Game Over! ${data.winner === 'humans' ? 'Humans Win!' : 'AI Wins!'}`, data.winner === 'humans' ? '#4caf50' : '#d32f2f');
@@ -463,6 +498,14 @@ document.addEventListener('DOMContentLoaded', () => {
             addMessageToLog(`<strong>${data.asker}</strong> asks <strong>${data.target}</strong>: ${data.question}`, 'question');
         });
         
+        state.socket.on('question_accepted', () => {
+            const pending = state.pendingQuestion;
+            state.pendingQuestion = null;
+            if (pending) {
+                addMessageToLog(`<strong>${state.myUsername}</strong> asks <strong>${pending.target}</strong>: ${pending.question}`, 'question');
+            }
+        });
+        
         state.socket.on('ai_question', (data) => {
         console.log('AI question:', data);
         
@@ -487,6 +530,14 @@ document.addEventListener('DOMContentLoaded', () => {
             addMessageToLog(`<strong>${data.target}</strong> answers: ${data.answer}`, 'answer');
         });
         
+        state.socket.on('answer_accepted', () => {
+            const pending = state.pendingAnswer;
+            state.pendingAnswer = null;
+            if (pending) {
+                addMessageToLog(`<strong>${state.myUsername}</strong> answers: ${pending}`, 'answer');
+            }
+        });
+        
         state.socket.on('ai_answer', (data) => {
         console.log('AI answer:', data);
         
@@ -498,15 +549,13 @@ document.addEventListener('DOMContentLoaded', () => {
             updateTurnIndicator('Processing answer...', '#666');
         });
         
-        state.socket.on('location_guess_made', (data) => {
-        console.log('Location guess made:', data);
-        
-        // Add anonymous location guess to chat with appropriate emoji
-        const emoji = data.is_correct ? "🎯" : "❌";
-            addMessageToLog(`<strong>${emoji} ${data.message}</strong>`, data.is_correct ? 'success' : 'error');
+        state.socket.on('question_count_update', (data) => {
+            // A wrong AI guess arrives with the count update that follows it
+            if (data.location_guess) {
+                showLocationGuess(data.location_guess);
+            }
+            updateQuestionCounter(data);
         });
-        
-        state.socket.on('question_count_update', updateQuestionCounter);
 
         // --- Voting Handlers ---
         state.socket.on('voting_started', (data) => {
@@ -564,10 +613,7 @@ document.addEventListener('DOMContentLoaded', () => {
         });
 
         // --- Miscellaneous Handlers ---
-        state.socket.on('win_counter_update', (data) => {
-            DOM.humanWinsDisplay.textContent = data.human_wins;
-            DOM.aiWinsDisplay.textContent = data.ai_wins;
-        });
+        state.socket.on('win_counter_update', updateWinCounter);
 
         state.socket.on('username_taken', (data) => {
             addMessageToLog(data.message, 'error');
@@ -0,0 +1,94 @@
+"""The AI's delayed question and answer must act on the lobby as it is after the OpenAI call."""
+
+import pytest
+from game import ai
+from game.logic import GameManager, players_room
+from models.database import SessionLocal, get_lobby
+
+
+class Pending:
+    """Stands in for a Prefetch; `during` runs while the AI is 'waiting on OpenAI'."""
+
+    def __init__(self, value, during=None):
+        self.value = value
+        self.during = during
+
+    def result(self):
+        if self.during:
+            self.during()
+        return self.value
+
+
+def change_lobby(**values):
+    """Another event updating the lobby row in its own session."""
+    def run():
+        session = SessionLocal()
+        lobby = get_lobby(session, 'main')
+        for name, value in values.items():
+            setattr(lobby, name, value)
+        session.commit()
+        session.close()
+    return run
+
+
+@pytest.fixture
+def manager(session, socketio, add_players):
+    add_players('alice', 'bob', ai='Bot')
+    lobby = get_lobby(session, 'main')
+    lobby.state = 'playing'
+    lobby.location = 'Hotel'
+    lobby.player_order = 'sid-Bot,sid-alice,sid-bob'
+    lobby.question_count = 2
+    session.commit()
+    return GameManager(socketio)
+
+
+def ask_as_ai(session, manager, socketio, pending):
+    lobby = get_lobby(session, 'main')
+    lobby.current_question_asker = 'sid-Bot'
+    lobby.current_target = 'sid-alice'
+    session.commit()
+    ai.run_ai_question(socketio, 'main', 'sid-Bot', 'sid-alice', manager, pending)
+
+
+def answer_as_ai(session, manager, socketio, pending):
+    lobby = get_lobby(session, 'main')
+    lobby.current_question_asker = 'sid-alice'
+    lobby.current_target = 'sid-Bot'
+    session.commit()
+    ai.run_ai_answer(socketio, 'main', 'sid-Bot', 'Where are we?', 'Hotel', manager, pending)
+
+
+def test_ai_question_is_sent_when_the_turn_is_unchanged(session, socketio, manager):
+    ask_as_ai(session, manager, socketio, Pending('What do you see?'))
+
+    assert socketio.events('question_asked') == [({
+        'asker': 'Bot', 'target': 'alice', 'question': 'What do you see?',
+        'asker_sid': 'sid-Bot', 'target_sid': 'sid-alice'
+    }, players_room('main'))]
+    assert socketio.events('turn_update')[-1][1] == 'sid-alice'
+
+
+def test_ai_question_is_dropped_when_the_turn_moved_on_during_the_call(session, socketio, manager):
+    ask_as_ai(session, manager, socketio,
+              Pending('What do you see?', change_lobby(current_question_asker='sid-alice', current_target='sid-bob')))
+
+    assert socketio.events('question_asked') == []
+
+
+def test_ai_answer_is_dropped_when_the_game_was_reset_during_the_call(session, socketio, manager):
+    answer_as_ai(session, manager, socketio, Pending('Lots of luggage.', change_lobby(state='waiting')))
+
+    assert socketio.events('ai_answer') == []
+    assert get_lobby(session, 'main', fresh=True).question_count == 2
+
+
+def test_ai_answer_counts_from_the_current_row(session, socketio, manager, monkeypatch):
+    monkeypatch.setattr(ai, 'generate_location_guess', lambda *args: None)
+    # Another answer lands while the AI is waiting on OpenAI
+    answer_as_ai(session, manager, socketio, Pending('Lots of luggage.', change_lobby(question_count=3)))
+
+    assert socketio.events('ai_answer')[0][0]['answer'] == 'Lots of luggage.'
+    lobby = get_lobby(session, 'main', fresh=True)
+    assert lobby.question_count == 4
+    assert socketio.events('question_count_update')[-1][0]['question_count'] == 4
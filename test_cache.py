@@ -0,0 +1,114 @@
+"""In-memory LRU caches and the Redis wrapper's behaviour when Redis is missing or down."""
+
+import pytest
+from cache import client as cache_client
+from cache.client import RedisClient
+from utils.lru import LRUDict
+
+
+def test_lru_dict_evicts_the_least_recently_used_key():
+    cache = LRUDict(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache.get('a')  # reading counts as a use
+    cache['c'] = 3
+
+    assert list(cache) == ['a', 'c']
+    assert cache.get('b', 'missing') == 'missing'
+
+
+def test_lru_dict_overwrite_does_not_grow():
+    cache = LRUDict(2)
+    cache['a'] = 1
+    cache['a'] = 2
+    cache['b'] = 3
+
+    assert dict(cache) == {'a': 2, 'b': 3}
+
+
+@pytest.fixture(params=[None, 'redis://127.0.0.1:1/0'], ids=['no-url', 'unreachable'])
+def down(request):
+    return RedisClient(request.param)
+
+
+def test_redis_client_degrades_to_misses(down):
+    assert down.get('key') is None
+    assert down.set('key', {'a': 1}) is False
+    assert down.get_list('key') is None
+    assert down.exists('key') is False
+    assert down.delete('key') is False
+    assert down.push_capped('key', 'value', 10) is False
+
+
+def test_redis_client_claims_succeed_without_redis(down):
+    # Without a shared store every worker must be allowed to do the work itself
+    assert down.claim('startup', ttl=60) is True
+
+
+def test_redis_pipeline_yields_none_without_redis(down):
+    with down.pipeline() as pipe:
+        assert pipe is None
+
+
+def test_unreachable_redis_is_pinged_at_most_once_per_interval(monkeypatch):
+    down = RedisClient('redis://127.0.0.1:1/0')
+    pings = []
+    monkeypatch.setattr(down.client, 'ping', lambda: pings.append(1) or False)
+    now = [100.0]
+    monkeypatch.setattr(cache_client.time, 'monotonic', lambda: now[0])
+
+    down.get('a')
+    down.get('b')
+    assert len(pings) == 1
+
+    now[0] += cache_client.RECONNECT_CHECK_INTERVAL
+    down.get('c')
+    assert len(pings) == 2
+
+
+class RecordingPipeline:
+    def __init__(self):
+        self.calls = []
+
+    def delete(self, *keys):
+        self.calls.append('delete')
+
+    def execute(self):
+        self.calls.append('execute')
+
+    def reset(self):
+        self.calls.append('reset')
+
+
+class RecordingClient:
+    def __init__(self):
+        self.pipe = RecordingPipeline()
+
+    def pipeline(self):
+        return self.pipe
+
+
+@pytest.fixture
+def connected():
+    redis = RedisClient()
+    redis.client = RecordingClient()
+    redis.connected = True
+    return redis, redis.client.pipe
+
+
+def test_redis_pipeline_executes_and_resets(connected):
+    redis, pipe = connected
+    with redis.pipeline() as p:
+        redis.delete('key', pipe=p)
+
+    assert pipe.calls == ['delete', 'execute', 'reset']
+
+
+def test_redis_pipeline_discards_commands_when_the_block_fails(connected):
+    redis, pipe = connected
+    with pytest.raises(ValueError):
+        with redis.pipeline() as p:
+            redis.delete('key', pipe=p)
+            raise ValueError('boom')
+
+    assert pipe.calls == ['delete', 'reset']
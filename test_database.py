@@ -0,0 +1,82 @@
+"""Database helpers: deleting a player on disconnect, resetting a lobby and reading messages."""
+
+import pytest
+from models import database
+from models.database import (
+    Player, Message, Vote, get_lobby, reset_lobby, delete_player_by_sid, add_message, get_messages,
+    get_win_counter, increment_ai_wins
+)
+
+
+@pytest.fixture(params=[True, False], ids=['returning', 'select-then-delete'])
+def delete_returning(request, monkeypatch):
+    """Run a test with DELETE ... RETURNING and with the fallback for databases without it."""
+    monkeypatch.setattr(database.engine.dialect, 'delete_returning', request.param)
+    return request.param
+
+
+def usernames(session, room='main'):
+    lobby = get_lobby(session, room)
+    return sorted(p.username for p in session.query(Player).filter_by(lobby_id=lobby.id))
+
+
+def test_delete_player_by_id(session, add_players, delete_returning):
+    alice, _ = add_players('alice', 'bob')
+
+    assert delete_player_by_sid(session, 'main', 'sid-alice', alice.id) == 'alice'
+    session.commit()
+    assert usernames(session) == ['bob']
+
+
+def test_delete_player_by_sid_within_the_room(session, add_players, delete_returning):
+    add_players('alice', 'bob')
+    # The same sid in another room must survive
+    session.add(Player(sid='sid-alice', username='alice', lobby=get_lobby(session, 'other')))
+    session.commit()
+
+    assert delete_player_by_sid(session, 'main', 'sid-alice') == 'alice'
+    session.commit()
+    assert usernames(session) == ['bob']
+    assert usernames(session, 'other') == ['alice']
+
+
+def test_delete_unknown_player_returns_none(session, add_players, delete_returning):
+    alice, _ = add_players('alice', 'bob')
+
+    assert delete_player_by_sid(session, 'main', 'sid-nobody') is None
+    # A stale id for another sid deletes nothing
+    assert delete_player_by_sid(session, 'main', 'sid-bob', alice.id) is None
+    session.commit()
+    assert usernames(session) == ['alice', 'bob']
+
+
+def test_reset_lobby_clears_one_room_and_keeps_win_counts(session, add_players):
+    add_players('alice', ai='Bot')
+    lobby = get_lobby(session, 'main')
+    lobby.state = 'playing'
+    lobby.player_order = 'sid-alice,sid-Bot'
+    lobby.turn = 3
+    add_message(session, lobby, 'alice asks Bot: Where are we?')
+    session.add(Vote(voter_sid='sid-alice', voted_for_sid='sid-Bot', lobby_id=lobby.id))
+    other = get_lobby(session, 'other')
+    add_message(session, other, 'hello')
+    increment_ai_wins(session, 'main')
+
+    lobby = reset_lobby(session, 'main')
+    session.commit()
+
+    assert (lobby.state, lobby.player_order, lobby.turn, lobby.location) == ('waiting', '', 0, None)
+    assert usernames(session) == []
+    assert session.query(Message).filter_by(lobby_id=lobby.id).count() == 0
+    assert session.query(Vote).filter_by(lobby_id=lobby.id).count() == 0
+    assert [m.content for m in get_messages(session, other)] == ['hello']
+    assert get_win_counter(session, 'main').ai_wins == 1
+
+
+def test_get_messages_limit_returns_the_latest_oldest_first(session):
+    lobby = get_lobby(session, 'main')
+    for i in range(5):
+        add_message(session, lobby, f"message {i}")
+
+    assert [m.content for m in get_messages(session, lobby, limit=2)] == ['message 3', 'message 4']
+    assert len(get_messages(session, lobby)) == 5
@@ -0,0 +1,47 @@
+"""Socket handler helpers: payload validation and the per-client rate limit."""
+
+import time
+from socket_handlers.handlers import parse_payload, allow_event, RATE_LIMIT_BURST, RATE_LIMIT_PER_SECOND
+
+FIELDS = {'question': 'Question is required.', 'target': 'Target is required.'}
+
+
+def test_parse_payload_strips_required_fields():
+    values, error = parse_payload({'question': '  Is it warm?  ', 'target': 'bob', 'extra': 1}, FIELDS)
+
+    assert error is None
+    assert values == {'question': 'Is it warm?', 'target': 'bob'}
+
+
+def test_parse_payload_reports_the_first_bad_field():
+    assert parse_payload({'question': '   ', 'target': 'bob'}, FIELDS) == (None, 'Question is required.')
+    assert parse_payload({'question': 'Why?'}, FIELDS) == (None, 'Target is required.')
+    assert parse_payload({'question': 'Why?', 'target': 7}, FIELDS) == (None, 'Target is required.')
+
+
+def test_parse_payload_rejects_non_dict_payloads():
+    for data in (None, 'question', ['question']):
+        assert parse_payload(data, FIELDS) == (None, 'Invalid request.')
+
+
+def test_allow_event_allows_a_burst_then_refills(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+
+    assert all(allow_event('sid-burst') for _ in range(RATE_LIMIT_BURST))
+    assert not allow_event('sid-burst')
+
+    # One token comes back every 1/rate seconds
+    now[0] += 1 / RATE_LIMIT_PER_SECOND
+    assert allow_event('sid-burst')
+    assert not allow_event('sid-burst')
+
+
+def test_allow_event_limits_each_client_separately(monkeypatch):
+    monkeypatch.setattr(time, 'monotonic', lambda: 2000.0)
+
+    for _ in range(RATE_LIMIT_BURST):
+        allow_event('sid-busy')
+
+    assert not allow_event('sid-busy')
+    assert allow_event('sid-quiet')
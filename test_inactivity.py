@@ -0,0 +1,28 @@
+"""Inactivity tracking is kept per room and only while a game is running."""
+
+from game.logic import GameManager
+
+
+def test_activity_is_tracked_per_room_while_playing(socketio):
+    manager = GameManager(socketio)
+
+    manager.update_activity('main', 'playing')
+    manager.update_activity('other', 'waiting')
+    manager.pause_inactivity_timer('main')
+    manager.update_activity('second', 'voting')
+
+    assert set(manager._last_activity) == {'main', 'second'}
+    assert manager._inactivity_paused == {'main'}
+
+    manager.stop_inactivity_timer('main')
+    assert set(manager._last_activity) == {'second'}
+    assert manager._inactivity_paused == set()
+
+
+def test_resume_does_not_start_watching_an_idle_room(socketio):
+    manager = GameManager(socketio)
+
+    manager.pause_inactivity_timer('main')
+    manager.resume_inactivity_timer('main')
+
+    assert 'main' not in manager._last_activity
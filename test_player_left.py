@@ -0,0 +1,76 @@
+"""A player disconnecting mid-game must not stall the turn or shift who asks next."""
+
+from game.logic import GameManager
+from models.database import get_lobby, delete_player_by_sid
+
+
+def start_playing(session, socketio, add_players, names, turn=0):
+    """Put the main lobby mid-game with a fixed asking order and start the turn at `turn`."""
+    add_players(*names)
+    lobby = get_lobby(session, 'main')
+    lobby.state = 'playing'
+    lobby.player_order = ','.join(f"sid-{name}" for name in names)
+    lobby.turn = turn
+    session.commit()
+    manager = GameManager(socketio)
+    manager.start_next_turn('main')
+    return manager
+
+
+def leave(manager, session, sid):
+    """What the disconnect handler does for a player's socket."""
+    manager.unregister_player(sid)
+    delete_player_by_sid(session, 'main', sid)
+    session.commit()
+    manager.handle_player_left('main', sid)
+    return get_lobby(session, 'main', fresh=True)
+
+
+def test_asker_leaving_mid_game_starts_the_next_turn(session, socketio, add_players):
+    manager = start_playing(session, socketio, add_players, ['alice', 'bob', 'carol'])
+    assert get_lobby(session, 'main', fresh=True).current_question_asker == 'sid-alice'
+    manager.record_question('main', 'Is it cold here?')
+
+    lobby = leave(manager, session, 'sid-alice')
+
+    assert lobby.player_order == 'sid-bob,sid-carol'
+    assert lobby.current_question_asker == 'sid-bob'
+    assert lobby.current_target == 'sid-carol'
+    assert socketio.events('turn_update')[-1][1] == 'sid-bob'
+    # The departed asker's question never gets an answer
+    assert 'main' not in manager._pending_questions
+
+
+def test_target_leaving_mid_game_gives_the_asker_a_new_target(session, socketio, add_players):
+    manager = start_playing(session, socketio, add_players, ['alice', 'bob', 'carol'])
+    target = get_lobby(session, 'main', fresh=True).current_target
+
+    lobby = leave(manager, session, target)
+
+    assert lobby.current_question_asker == 'sid-alice'
+    assert lobby.current_target not in (None, target, 'sid-alice')
+
+
+def test_earlier_player_leaving_keeps_the_current_asker(session, socketio, add_players):
+    # Turn 6 of 4 players is carol's; bob sits before her in the order
+    manager = start_playing(session, socketio, add_players, ['alice', 'bob', 'carol', 'dave'], turn=6)
+    assert get_lobby(session, 'main', fresh=True).current_question_asker == 'sid-carol'
+
+    lobby = leave(manager, session, 'sid-bob')
+
+    assert lobby.player_order == 'sid-alice,sid-carol,sid-dave'
+    assert lobby.current_question_asker == 'sid-carol'
+    # After her answer the turn moves on to dave, not back past him
+    lobby.turn += 1
+    assert lobby.player_order.split(',')[lobby.turn % 3] == 'sid-dave'
+
+
+def test_player_leaving_a_waiting_lobby_changes_nothing(session, socketio, add_players):
+    add_players('alice', 'bob')
+    manager = GameManager(socketio)
+
+    lobby = leave(manager, session, 'sid-alice')
+
+    assert lobby.state == 'waiting'
+    assert lobby.current_question_asker is None
+    assert socketio.events('turn_update') == []
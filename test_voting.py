@@ -0,0 +1,94 @@
+"""Vote tallying: one vote per voter, passes, majorities and ties."""
+
+import pytest
+from game.logic import GameManager
+from models.database import Vote, get_lobby, get_votes_by_voter
+
+
+@pytest.fixture
+def voting(session, add_players):
+    """Put the main lobby into voting with the given players; returns the lobby."""
+    def start(*usernames, ai='Bot'):
+        add_players(*usernames, ai=ai)
+        lobby = get_lobby(session, 'main')
+        lobby.state = 'voting'
+        session.commit()
+        return lobby
+    return start
+
+
+def test_votes_by_voter_keeps_each_voters_latest_vote(session, voting):
+    lobby = voting('alice', 'bob')
+    session.add_all([
+        Vote(voter_sid='sid-alice', voted_for_sid='sid-bob', lobby_id=lobby.id),
+        Vote(voter_sid='sid-bob', voted_for_sid='pass', lobby_id=lobby.id),
+        Vote(voter_sid='sid-alice', voted_for_sid='sid-Bot', lobby_id=lobby.id),
+    ])
+    session.commit()
+
+    assert get_votes_by_voter(session, lobby) == {'sid-alice': 'sid-Bot', 'sid-bob': 'pass'}
+
+
+def test_changed_vote_is_counted_once(session, socketio, voting):
+    voting('alice', 'bob')
+    manager = GameManager(socketio)
+
+    manager.handle_vote('sid-alice', 'sid-bob', 'main')
+    manager.handle_vote('sid-alice', 'sid-Bot', 'main')
+
+    assert [data['total_votes'] for data, _ in socketio.events('vote_status_update')] == [1, 1]
+    assert socketio.events('voting_results') == socketio.events('game_ended') == []
+
+
+def test_majority_against_the_ai_wins_for_the_humans(session, socketio, voting):
+    voting('alice', 'bob')
+    manager = GameManager(socketio)
+
+    manager.process_voting_results('main', {
+        'sid-alice': 'sid-Bot', 'sid-bob': 'sid-Bot', 'sid-Bot': 'sid-alice'
+    })
+
+    assert socketio.events('game_ended')[0][0]['winner'] == 'humans'
+
+
+def test_all_passes_continue_the_game(session, socketio, voting):
+    voting('alice', 'bob')
+    manager = GameManager(socketio)
+
+    manager.process_voting_results('main', {'sid-alice': 'pass', 'sid-bob': 'pass', 'sid-Bot': 'pass'})
+
+    assert socketio.events('voting_results')[0][0]['all_passed'] is True
+    assert get_lobby(session, 'main', fresh=True).state == 'playing'
+
+
+def test_tie_eliminates_every_tied_player(session, socketio, voting):
+    voting('alice', 'bob', 'carol')
+    manager = GameManager(socketio)
+
+    manager.process_voting_results('main', {
+        'sid-alice': 'sid-bob', 'sid-bob': 'sid-alice', 'sid-carol': 'pass', 'sid-Bot': 'pass'
+    })
+
+    results = socketio.events('voting_results')[0][0]
+    assert sorted(results['eliminated']) == ['sid-alice', 'sid-bob']
+    assert socketio.events('game_ended') == []
+
+
+def test_tie_between_two_players_goes_to_the_humans(session, socketio, voting):
+    voting('alice')
+    manager = GameManager(socketio)
+
+    manager.process_voting_results('main', {'sid-alice': 'sid-Bot', 'sid-Bot': 'sid-alice'})
+
+    assert socketio.events('game_ended')[0][0]['winner'] == 'humans'
+
+
+def test_votes_for_departed_players_are_ignored(session, socketio, voting):
+    voting('alice', 'bob')
+    manager = GameManager(socketio)
+
+    manager.process_voting_results('main', {
+        'sid-alice': 'sid-Bot', 'sid-bob': 'sid-gone', 'sid-Bot': 'sid-gone'
+    })
+
+    assert socketio.events('game_ended')[0][0]['winner'] == 'humans'
@@ -1,7 +1,8 @@
 # Game Constants
-LOCATIONS = [
+LOCATIONS = (
     "Beach", "Casino", "Circus", "Corporate Party", "Cruise Ship",
     "Day Spa", "Embassy", "Hospital", "Hotel", "Military Base",
     "Movie Studio", "Ocean Liner", "Passenger Train", "Pirate Ship", "Polar Station"
-]
-AI_NAMES = ["Alex", "Sam", "Jordan", "Casey", "Taylor", "Morgan", "Riley", "Quinn", "Avery", "Blake"] 
\ No newline at end of file
+)
+AI_NAMES = ("Alex", "Sam", "Jordan", "Casey", "Taylor", "Morgan", "Riley", "Quinn", "Avery", "Blake")
+AI_NAMES_SET = frozenset(AI_NAMES)
@@ -0,0 +1,24 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+class OrjsonSerializer:
+    """Drop-in for the json module, backed by orjson, used to encode Socket.IO packets."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        # python-socketio passes stdlib options such as separators; orjson output is already compact
+        return orjson.dumps(obj).decode('utf-8')
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, for jsonify and dict responses."""
+
+    def dumps(self, obj, **kwargs):
+        # Flask's fallback (dates, dataclasses, UUIDs) covers anything orjson doesn't encode natively
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
@@ -0,0 +1,42 @@
+import threading
+
+def run_after(socketio, delay, fn, *args, is_current=None):
+    """Call fn(*args) on a background task after `delay` seconds.
+
+    Pass plain values rather than ORM objects; they outlive the session that
+    loaded them. If is_current is given it is checked once the delay is up and
+    the call is dropped when it returns False (e.g. the game was reset).
+    """
+    socketio.start_background_task(_run_after, socketio, delay, fn, args, is_current)
+
+def _run_after(socketio, delay, fn, args, is_current):
+    socketio.sleep(delay)
+    if is_current is not None and not is_current():
+        return
+    fn(*args)
+
+class Prefetch:
+    """Run fn(*args) on a background task now and hand back its value later.
+
+    Lets a slow call (an OpenAI request) overlap a deliberate delay instead of
+    starting after it. result() waits for the call if it hasn't finished.
+    """
+    def __init__(self, socketio, fn, *args):
+        self._done = threading.Event()  # green under eventlet's monkey patching
+        self._value = None
+        self._error = None
+        socketio.start_background_task(self._run, fn, args)
+
+    def _run(self, fn, args):
+        try:
+            self._value = fn(*args)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    def result(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value